@@ -0,0 +1,154 @@
+import asyncio
+import time
+import logging
+from Controller import ControllerBase, DataType
+
+
+class AsyncUDPController(ControllerBase, asyncio.DatagramProtocol):
+    """
+    asyncio version of UDP_Controller. Same variable API and wire protocol, but no thread:
+    datagrams are handled by the event loop, so many controllers can share one loop.
+    All methods must be called from the event loop thread.
+
+        ctrl = AsyncUDPController(port=8500)
+        ctrl.addVariable("sensor", DataType.STRING, "")
+        await ctrl.start()
+        async for tick in ctrl.ticks(0.02):
+            ...
+    """
+
+    def __init__(self, ip:str="0.0.0.0", port:int=8400, max_size:int=1024, log_lever=logging.INFO, allow_binary:bool=True):
+        ControllerBase.__init__(self, ip, port, max_size, log_lever, allow_binary)
+        self._loop = None
+        self._transport = None
+        self._flush_scheduled = False
+        self._flush_timer = None
+        self._waiters = {}
+        self._drain_waiters = []
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self._loop.create_datagram_endpoint(lambda: self, local_addr=(self._ip, self._port))
+        logging.info(f"Controller UDP server listening: {self._ip}: {self._port}")
+
+    def close(self):
+        self._running = False
+        if self._exporter is not None:
+            self._exporter.close()
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        if self._transport is not None:
+            self._transport.close()
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def connection_lost(self, exc):
+        self._transport = None
+        for waiters in self._waiters.values():
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.cancel()
+        self._waiters.clear()
+
+    def datagram_received(self, data, addr):
+        _start = time.perf_counter()
+        self._send(self._receive(data, addr), addr)
+        if self._observers:
+            # Inbound changes mirrored to observers
+            self._notify_pending()
+        self._schedule_deadline()
+        self._record_iteration(time.perf_counter() - _start)
+
+    def error_received(self, exc):
+        logging.debug(f"Receive error: {exc}")
+        self._net_stats["receive_errors"] += 1
+
+    def _notify_pending(self):
+        # Coalesce every setValue done in the same loop iteration into one datagram
+        if not self._flush_scheduled and self._loop is not None:
+            self._flush_scheduled = True
+            self._loop.call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        if self._sessions:
+            for _addr, _send_data in self._outbound():
+                self._send(_send_data, _addr)
+            self._schedule_deadline()
+
+    def _schedule_deadline(self):
+        # Changes held back by the send period or rate limits are retried when they become due
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        timeout = self._timeout()
+        if timeout is not None and self._loop is not None:
+            self._flush_timer = self._loop.call_later(timeout, self._flush)
+
+    def _send(self, _send_data:dict, _addr):
+        if _send_data and self._transport is not None:
+            self._transport.sendto(self._encode(_send_data, _addr), _addr)
+            logging.debug(f"Data sent to {_addr}: {_send_data}")
+
+    def _notify_drained(self):
+        ControllerBase._notify_drained(self)
+        while self._drain_waiters:
+            waiter = self._drain_waiters.pop()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def drain(self, timeout:float=1.0) -> bool:
+        """Send pending changes now and wait until critical variables are confirmed (see setCritical)."""
+        failed = self._send_stats["critical_failed"]
+        self.flush()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self._lock:
+                if self._is_drained():
+                    return self._send_stats["critical_failed"] == failed
+                waiter = loop.create_future()
+                self._drain_waiters.append(waiter)
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                return False
+
+    def _on_change(self, name:str, value:any):
+        waiters = self._waiters.pop(name, None)
+        if waiters:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(value)
+
+    async def changed(self, name:str):
+        """Wait until variable name takes a new value and return it."""
+        assert name in self._variables, f"Variable {name} is not defined!"
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(name, []).append(waiter)
+        return await waiter
+
+    async def ticks(self, period:float):
+        """
+        Async generator yielding (tick number, seconds since previous tick) every period seconds.
+        Deadlines are absolute, so time spent in the loop body does not stretch the period.
+        """
+        loop = asyncio.get_running_loop()
+        tick = 0
+        last = next_time = loop.time()
+        while self._running:
+            next_time += period
+            delay = next_time - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # Overrun: skip the missed deadlines instead of bursting to catch up
+                next_time = loop.time()
+            now = loop.time()
+            tick += 1
+            yield tick, now - last
+            last = now
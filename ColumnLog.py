@@ -0,0 +1,261 @@
+# ColumnLog.py
+# Columnar on-disk log of controller variables, for hours of many-robot traffic. Queries are served
+# from mmap without parsing.
+#
+#   ctrl.setRecorder(ColumnRecorder("logs"))      # or one per RobotChannel of a ControllerHub
+#   ...
+#   log = ColumnLog("logs")
+#   times, values = log.query(8500, "sensor", start, end)   # wall-clock seconds (time.time())
+#
+# Layout: <root>/<port>/<variable>.meta holds the datatype. <variable>.t holds float64 timestamps,
+# non-decreasing. <variable>.v holds one fixed-width value per timestamp. <variable>.idx is a sparse
+# index holding the timestamp of every INDEX_STRIDE-th record. STRING values are stored in .v as a
+# (uint64 offset, uint32 length) reference into a <variable>.s heap of utf-8 bytes.
+# With numpy installed, numeric queries return arrays backed by the mapped file. Without numpy they
+# return memoryviews, equally without a copy.
+
+import os
+import mmap
+import struct
+import threading
+import time
+from bisect import bisect_left
+from Controller import DataType, _BINARY_FORMATS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INDEX_STRIDE = 4096
+_TIME = struct.Struct('<d')
+_STRREF = struct.Struct('<QI')
+
+
+def _value_struct(datatype:DataType) -> struct.Struct:
+    fmt = _BINARY_FORMATS[datatype]
+    return struct.Struct(fmt) if fmt else _STRREF
+
+
+class _ColumnWriter:
+    """
+    Buffered appender of one variable's column files. The files are only opened while a buffer is
+    written out, so a fleet of robots does not hold four descriptors per variable.
+    """
+
+    def __init__(self, directory:str, name:str, datatype:DataType, buffer_size:int):
+        self.datatype = datatype
+        self.value_struct = _value_struct(datatype)
+        self.buffer_size = buffer_size
+        self.base = os.path.join(directory, name)
+        self.exts = (".s", ".v", ".idx", ".t") if datatype == DataType.STRING else (".v", ".idx", ".t")
+        self.count = 0
+        self.heap_size = 0
+        self.last_time = float("-inf")
+        if os.path.exists(self.base + ".meta"):
+            self._reopen(name)
+        else:
+            with open(self.base + ".meta", "w") as f:
+                f.write(datatype.value)
+        self.buffers = {ext: bytearray() for ext in self.exts}
+
+    def _reopen(self, name:str):
+        with open(self.base + ".meta") as f:
+            stored = DataType(f.read().strip())
+        if stored != self.datatype:
+            raise ValueError(f"{name}: column {self.base} holds {stored.value}, not {self.datatype.value}")
+        # A crash may leave a partial record, or values and index entries of timestamps never written
+        path = self.base + ".t"
+        self.count = os.path.getsize(path) // _TIME.size if os.path.exists(path) else 0
+        sizes = {".t": self.count * _TIME.size, ".v": self.count * self.value_struct.size,
+                 ".idx": -(-self.count // INDEX_STRIDE) * _TIME.size}
+        for ext, size in sizes.items():
+            if os.path.exists(self.base + ext) and os.path.getsize(self.base + ext) > size:
+                os.truncate(self.base + ext, size)
+        if self.datatype == DataType.STRING and os.path.exists(self.base + ".s"):
+            self.heap_size = os.path.getsize(self.base + ".s")
+        if self.count:
+            # Later records never go before the stored ones, even if the wall clock stepped back
+            with open(path, "rb") as f:
+                f.seek((self.count - 1) * _TIME.size)
+                self.last_time = _TIME.unpack(f.read(_TIME.size))[0]
+
+    def append(self, timestamp:float, value:any):
+        # Timestamps must not go backwards, or the column could not be bisected
+        timestamp = max(timestamp, self.last_time)
+        self.last_time = timestamp
+        if self.count % INDEX_STRIDE == 0:
+            self.buffers[".idx"] += _TIME.pack(timestamp)
+        self.buffers[".t"] += _TIME.pack(timestamp)
+        if self.datatype == DataType.STRING:
+            raw = str(value).encode('utf-8')
+            self.buffers[".v"] += _STRREF.pack(self.heap_size, len(raw))
+            self.buffers[".s"] += raw
+            self.heap_size += len(raw)
+            pending = len(self.buffers[".t"]) + len(self.buffers[".s"])
+        else:
+            self.buffers[".v"] += self.value_struct.pack(value)
+            pending = len(self.buffers[".t"])
+        self.count += 1
+        if pending >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        # Values before timestamps: a reader never sees a timestamp whose value is not on disk yet
+        for ext in self.exts:
+            if self.buffers[ext]:
+                with open(self.base + ext, "ab") as f:
+                    f.write(self.buffers[ext])
+                self.buffers[ext].clear()
+
+    def close(self):
+        self.flush()
+
+
+class ColumnRecorder:
+    """
+    Recorder (see ControllerBase.setRecorder) writing every change of a controller's variables,
+    inbound and outbound, to <root>/<port>/ in the ColumnLog format.
+    """
+
+    def __init__(self, root:str, buffer_size:int=64*1024):
+        self.root = root
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._controller = None
+        self._directory = None
+        self._columns = {}
+
+    def attach(self, controller):
+        with self._lock:
+            self._controller = controller
+            self._directory = os.path.join(self.root, str(controller._port))
+            os.makedirs(self._directory, exist_ok=True)
+            now = time.time()
+            for name, variable in list(controller._variables.items()):
+                self._column(name).append(now, variable.value)
+
+    def _column(self, name:str) -> _ColumnWriter:
+        column = self._columns.get(name, None)
+        if column is None:
+            datatype = self._controller._variables[name].datatype
+            column = self._columns[name] = _ColumnWriter(self._directory, name, datatype, self.buffer_size)
+        return column
+
+    def inbound(self, name:str, value:any):
+        with self._lock:
+            if self._directory is not None:
+                self._column(name).append(time.time(), value)
+
+    outbound = inbound
+
+    def flush(self):
+        with self._lock:
+            for column in self._columns.values():
+                column.flush()
+
+    def close(self):
+        with self._lock:
+            for column in self._columns.values():
+                column.close()
+            self._columns.clear()
+            self._directory = None
+
+
+class _MappedFile:
+    """Read-only mmap of a file as of when it was opened (empty files map to an empty buffer)."""
+
+    def __init__(self, path:str):
+        self.size = os.path.getsize(path) if os.path.exists(path) else 0
+        self._mmap = None
+        if self.size:
+            with open(path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size = len(self._mmap)
+            self.view = memoryview(self._mmap)
+        else:
+            self.view = memoryview(b"")
+
+    def close(self):
+        self.view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+
+class ColumnLog:
+    """Reader of a ColumnLog directory tree. Each query maps the column files as they are on disk now."""
+
+    def __init__(self, root:str):
+        self.root = root
+
+    def robots(self) -> list:
+        return sorted(int(name) for name in os.listdir(self.root) if name.isdigit())
+
+    def variables(self, port:int) -> dict:
+        directory = os.path.join(self.root, str(port))
+        variables = {}
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".meta"):
+                with open(os.path.join(directory, name)) as f:
+                    variables[name[:-5]] = DataType(f.read().strip())
+        return variables
+
+    def query(self, port:int, name:str, start:float=None, end:float=None):
+        """
+        (timestamps, values) of variable name of robot port with start <= timestamp < end.
+        Numeric columns come back as numpy arrays (memoryviews without numpy) backed by the mapped
+        files, valid as long as they are referenced; strings as a list of str.
+        """
+        base = os.path.join(self.root, str(port), name)
+        with open(base + ".meta") as f:
+            datatype = DataType(f.read().strip())
+        value_struct = _value_struct(datatype)
+        times = _MappedFile(base + ".t")
+        values = _MappedFile(base + ".v")
+        # Records whose value is not fully written yet are left out
+        count = min(times.size // _TIME.size, values.size // value_struct.size)
+        time_column = times.view[:count * _TIME.size].cast('d')
+        first, last = self._range(base, time_column, start, end)
+
+        if datatype == DataType.STRING:
+            heap = _MappedFile(base + ".s")
+            result = []
+            for i in range(first, last):
+                offset, length = _STRREF.unpack_from(values.view, i * _STRREF.size)
+                result.append(str(heap.view[offset:offset+length], 'utf-8'))
+            heap.close()
+            return self._times(time_column, first, last), result
+
+        value_column = values.view[first * value_struct.size:last * value_struct.size].cast(value_struct.format[1:])
+        if np is not None:
+            return self._times(time_column, first, last), np.frombuffer(value_column, dtype=value_struct.format)
+        return self._times(time_column, first, last), value_column
+
+    def _range(self, base:str, time_column:memoryview, start:float, end:float) -> tuple:
+        count = len(time_column)
+        index_file = _MappedFile(base + ".idx")
+        index = index_file.view[:index_file.size // _TIME.size * _TIME.size].cast('d')
+        # The sparse index narrows each search to one INDEX_STRIDE block, so only a few pages are touched
+        first = 0 if start is None else self._bisect(time_column, index, start)
+        last = count if end is None else self._bisect(time_column, index, end)
+        index.release()
+        index_file.close()
+        return first, max(first, last)
+
+    @staticmethod
+    def _bisect(time_column:memoryview, index:memoryview, timestamp:float) -> int:
+        """Position of the first record with a timestamp >= timestamp."""
+        # index[block - 1] < timestamp <= index[block], so the record is in block - 1
+        block = bisect_left(index, timestamp)
+        if block == 0:
+            return 0
+        count = len(time_column)
+        lo = min(count, (block - 1) * INDEX_STRIDE)
+        hi = min(count, block * INDEX_STRIDE)
+        return bisect_left(time_column, timestamp, lo, hi)
+
+    @staticmethod
+    def _times(time_column:memoryview, first:int, last:int):
+        if np is not None:
+            return np.frombuffer(time_column[first:last], dtype='<f8')
+        return time_column[first:last]
@@ -0,0 +1,380 @@
+# ControlEngine.py
+# One control engine for the teleop/auto scripts. Keyboard handling, speed clipping and decay,
+# AUTO/MANUAL switching and the stopinput policies live here. Each script only sets constants.
+# One engine runs any number of robots at a fixed tick rate, each with its own period.
+#
+#   python ControlEngine.py robots.json
+#
+#   {"tick": 0.01,
+#    "robots": [{"name": "robot1", "port": 8400, "policies": ["level_stop"], "forward_speed": 6.0},
+#               {"name": "robot2", "port": 8500, "preset": "manual"}]}
+#
+# Any RobotConfig field can be set per robot. "preset" starts from one of PRESETS.
+#
+# Policies (run every step in the order listed, before the keyboard and AUTO/MANUAL logic):
+#   level_stop  AUTO drives at forward_speed while stopinput < 24 V and stops while it is >= 24 V
+#   sequence    first rising edge of stopinput >= 24 V runs STOP -> TURN -> STRAIGHT once,
+#               overriding everything else while it runs (a StateMachine, see sequenceSpec)
+#   lockout     auto_lockout_after seconds after the first stopinput >= 24 V, AUTO is disabled for good
+#
+# Link monitoring is opt-in per robot ("link_timeout": 1.0): the sim must then send at least once per
+# link_timeout, otherwise the wheels are zeroed and steps paused until it is heard from again.
+
+import sys
+import json
+import time
+from ast import literal_eval
+from Controller import UDP_Controller, DataType, parseFloats, LOST
+from RateLoop import RateLoop
+from Keyboard import openKeyboard, drive, KEY_COMMANDS
+from StateMachine import MachineSpec, Transition, after, always
+
+AUTO = "AUTO"
+MANUAL = "MANUAL"
+
+
+class RobotConfig:
+    """Constants of one robot. forward_speed=None: no AUTO mode (manual only)."""
+
+    FIELDS = {
+        "name": "robot",
+        "ip": "0.0.0.0",
+        "port": 8400,
+        "max_speed": 7.0,           # clip for wheel speeds
+        "step": 1.0,                # speed increment per key press
+        "decay": 0.96,              # MANUAL slow down per step (None: keep the last speed)
+        "decay_with_keys": True,    # also decay on steps in which a key was pressed
+        "manual_dt": 0.01,          # step period in MANUAL
+        "auto_dt": 0.02,            # step period in AUTO
+        "forward_speed": None,      # AUTO cruise speed
+        "idle_back_to_auto": 2.0,   # seconds without keys before MANUAL returns to AUTO (None: never)
+        "policies": [],
+        "stop_time": 1.0,           # sequence timings (s) and speeds
+        "turn_time": 1.5,
+        "straight_time": 5.0,
+        "turn_speed": 3.0,
+        "straight_speed": 2.0,
+        "auto_lockout_after": 6.0,
+        "keyboard": True,           # take keys from the engine's keyboard
+        "log_keys": False,          # print every key action
+        "hud": False,               # status line every 0.3 s
+        "record_path": None,        # Telemetry log of every variable change
+        "heartbeat": 0.25,          # link poll period (s) when link_timeout is set
+        # Seconds without datagrams before the link is lost: wheels zeroed, steps paused. None: no link
+        # monitoring. The sim does not answer polls, so only set it when the sim sends more often than this
+        "link_timeout": None,
+        }
+
+    def __init__(self, preset:str=None, **fields):
+        values = dict(self.FIELDS)
+        if preset is not None:
+            assert preset in PRESETS, f"Unknown preset {preset}!"
+            values.update(PRESETS[preset])
+        for key in fields:
+            assert key in self.FIELDS, f"Unknown robot setting {key}!"
+        values.update(fields)
+        for policy in values["policies"]:
+            assert policy in POLICIES, f"Unknown policy {policy}!"
+        self.__dict__.update(values)
+
+
+# The original scripts, as configurations
+PRESETS = {
+    # manual.py: keys only, coast-down every step
+    "manual": {"port": 8500, "max_speed": 7.0, "hud": True},
+    # 2teleop_robot copy*.py: keys only, coast-down only without keys, key log
+    "manual_only": {"port": 8500, "max_speed": 2.0, "decay_with_keys": False, "log_keys": True},
+    # 2nd operation/1strobot.py: AUTO cruise that stops on a 24 V level, MANUAL on keys
+    "level_stop": {"port": 8400, "forward_speed": 6.0, "idle_back_to_auto": 1.5, "policies": ["level_stop"],
+                   "log_keys": True},
+    # teleop_robot.py: AUTO cruise, one-shot STOP -> TURN -> STRAIGHT on 24 V, then AUTO locked out
+    "teleop": {"port": 8400, "max_speed": 3.0, "forward_speed": 3.0, "idle_back_to_auto": 2.0,
+               "policies": ["lockout", "sequence"], "hud": True},
+    }
+
+
+def stopHigh(raw) -> bool:
+    """True if stopinput, raw ("[24,0,0]") or parsed ((24.0, 0.0, 0.0)), is at 24 V or more on its first element."""
+    try:
+        if isinstance(raw, str):
+            raw = literal_eval(raw)
+        if isinstance(raw, (list, tuple)) and raw:
+            return float(raw[0]) >= 24.0
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        pass
+    return False
+
+
+class RobotState:
+    """Everything that changes from one step to the next, for one robot."""
+    __slots__ = ("mode", "left", "right", "last_key_time", "stop_high", "rising_edge", "first_stop_time",
+                 "auto_blocked", "sequence", "next_time", "last_time", "last_hud")
+
+    def __init__(self, mode:str, sequence=None):
+        self.mode = mode
+        self.left = self.right = 0.0
+        self.last_key_time = 0.0
+        self.stop_high = False
+        self.rising_edge = False
+        self.first_stop_time = None
+        self.auto_blocked = False
+        self.sequence = sequence
+        self.next_time = 0.0
+        self.last_time = None
+        self.last_hud = 0.0
+
+
+def _policy_level_stop(robot, now:float, dt:float) -> bool:
+    # Only changes what AUTO drives at, see Robot._auto_speed
+    return False
+
+
+def sequenceSpec(config:RobotConfig) -> MachineSpec:
+    """
+    STOP -> TURN -> STRAIGHT, triggered once by the first rising edge of stopinput >= 24 V. The edge
+    is the one Robot.step counts (state.rising_edge), which also starts the lockout, so a pulse
+    shorter than a step still runs the sequence.
+    """
+    def rose(machine):
+        return machine.context.state.rising_edge
+    def triggered(machine):
+        machine.context.log("[SEQ] Triggered by stopinput [24,0,0] (one-shot)")
+    def drive_with(left, right):
+        def action(machine):
+            machine.context.state.left, machine.context.state.right = left, right
+        return action
+    # Speeds are re-asserted on every step of a state, over e.g. the lockout zeroing the wheels mid-sequence
+    return MachineSpec("IDLE", [
+        Transition("IDLE", "STOP", always(), guard=rose, once=True, action=triggered),
+        Transition("STOP", "TURN", after(config.stop_time)),
+        Transition("TURN", "STRAIGHT", after(config.turn_time)),
+        Transition("STRAIGHT", "IDLE", after(config.straight_time)),
+        ], during={
+        "STOP": drive_with(0.0, 0.0),
+        "TURN": drive_with(+config.turn_speed, -config.turn_speed),
+        "STRAIGHT": drive_with(config.straight_speed, config.straight_speed),
+        })
+
+
+def _policy_sequence(robot, now:float, dt:float) -> bool:
+    machine = robot.state.sequence
+    machine.step(now, robot.ctrl.getValue)
+    # Overrides everything else until back in IDLE (state 0)
+    return machine.state != 0
+
+
+def _policy_lockout(robot, now:float, dt:float) -> bool:
+    state = robot.state
+    if not state.auto_blocked and state.first_stop_time is not None and now - state.first_stop_time >= robot.config.auto_lockout_after:
+        state.auto_blocked = True
+        state.left = state.right = 0.0
+        state.mode = MANUAL
+        robot.log("[AUTO LOCKOUT] AUTO disabled; manual-only control now.")
+    return False
+
+
+POLICIES = {
+    "level_stop": _policy_level_stop,
+    "sequence": _policy_sequence,
+    "lockout": _policy_lockout,
+    }
+
+
+class Robot:
+    """A controller, its configuration, its step state and its policies."""
+
+    def __init__(self, config:RobotConfig, shared_name:bool=False):
+        self.config = config
+        self.state = RobotState(AUTO if config.forward_speed is not None else MANUAL)
+        if "sequence" in config.policies:
+            self.state.sequence = sequenceSpec(config).create(context=self)
+        self._policies = [POLICIES[name] for name in config.policies]
+        self._prefix = f"[{config.name}] " if shared_name else ""
+        self._stop_high = False
+        self._stop_rises = 0
+        self._rises_seen = 0
+        self.ctrl = UDP_Controller(ip=config.ip, port=config.port)
+        self.ctrl.addVariable("left_speed",  DataType.FLOAT, 0.0)
+        self.ctrl.addVariable("right_speed", DataType.FLOAT, 0.0)
+        self.ctrl.addVariable("sensor",      DataType.STRING, "")
+        # Receives "[24,0,0]" as string; getValue returns it parsed, e.g. (24.0, 0.0, 0.0)
+        self.ctrl.addVariable("stopinput",   DataType.STRING, "", parser=parseFloats)
+        self.ctrl.setCritical("left_speed")
+        self.ctrl.setCritical("right_speed")
+        if config.link_timeout is not None:
+            # The network thread zeroes the wheels as soon as the sim goes silent
+            self.ctrl.setHeartbeat(config.heartbeat, config.link_timeout)
+            self.ctrl.setFailsafe({"left_speed": 0.0, "right_speed": 0.0})
+        if config.policies:
+            # Edges are detected when a datagram changes stopinput, not every tick
+            self.ctrl.subscribe("stopinput", self._stop_rose, edge="rising", predicate=stopHigh)
+            self.ctrl.subscribe("stopinput", self._stop_fell, edge="falling", predicate=stopHigh)
+            if config.hud:
+                self.ctrl.subscribe("stopinput", lambda name, stop: self.log(f"raw_stop: {self.ctrl.getRawValue(name)}"))
+        self.recorder = None
+        if config.record_path:
+            from Telemetry import TelemetryRecorder
+            self.recorder = TelemetryRecorder(config.record_path)
+            self.ctrl.setRecorder(self.recorder)
+
+    def _stop_rose(self, name:str, stop:tuple):
+        # Network thread. A counter, so a pulse shorter than a tick still gives one rising edge
+        self._stop_high = True
+        self._stop_rises += 1
+
+    def _stop_fell(self, name:str, stop:tuple):
+        self._stop_high = False
+
+    def log(self, message:str):
+        print(f"\n{self._prefix}{message}")
+
+    def start(self):
+        self.ctrl.start()
+
+    def stop(self):
+        self.ctrl.setValues({"left_speed": 0.0, "right_speed": 0.0})
+        self.ctrl.close(drain=True)
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def due(self, now:float) -> bool:
+        return now >= self.state.next_time
+
+    def step(self, now:float, keys:list):
+        config, state = self.config, self.state
+        dt = config.manual_dt if state.last_time is None else now - state.last_time
+        state.last_time = now
+        if self.ctrl.linkState() == LOST:
+            # No sim to drive: keys are dropped and driving resumes from rest when it is back
+            state.left = state.right = 0.0
+            state.next_time = now + config.manual_dt
+            if state.sequence is not None:
+                # A maneuver resumes where it was, with its states' full durations
+                state.sequence.pause(now)
+            return []
+        if state.sequence is not None:
+            state.sequence.resume(now)
+
+        state.stop_high = self._stop_high
+        rises = self._stop_rises
+        state.rising_edge = rises != self._rises_seen
+        self._rises_seen = rises
+        if state.rising_edge and state.first_stop_time is None:
+            state.first_stop_time = now
+
+        overridden = False
+        for policy in self._policies:
+            overridden = policy(self, now, dt) or overridden
+        if overridden:
+            # Keys wait in the queue until the override is over
+            self._write(now, config.auto_dt)
+            return keys
+
+        key_seen = False
+        for key in keys:
+            key_seen = True
+            command = KEY_COMMANDS.get(key, None)
+            if command == "quit":
+                self._log_key(key, "quit")
+                raise KeyboardInterrupt
+            state.left, state.right = drive(command, state.left, state.right, config.step, config.max_speed)
+            if command is not None:
+                self._log_key(key, "stop" if command == "stop" else "")
+
+        if key_seen:
+            if state.mode != MANUAL and config.log_keys:
+                self.log(f"{time.time():.3f}s MANUAL start")
+            state.mode = MANUAL
+            state.last_key_time = now
+        elif (state.mode == MANUAL and config.forward_speed is not None and config.idle_back_to_auto is not None
+              and now - state.last_key_time >= config.idle_back_to_auto and not state.auto_blocked):
+            state.mode = AUTO
+            state.left = state.right = 0.0
+
+        if state.mode == AUTO:
+            state.left = state.right = self._auto_speed()
+            period = config.auto_dt
+        else:
+            if config.decay is not None and (config.decay_with_keys or not key_seen):
+                state.left *= config.decay
+                state.right *= config.decay
+                if abs(state.left)  < 1e-3: state.left  = 0.0
+                if abs(state.right) < 1e-3: state.right = 0.0
+            period = config.manual_dt
+        self._write(now, period)
+        return []
+
+    def _auto_speed(self) -> float:
+        if self.state.auto_blocked:
+            return 0.0
+        if "level_stop" in self.config.policies and self.state.stop_high:
+            return 0.0
+        return self.config.forward_speed
+
+    def _log_key(self, key:str, action:str):
+        if self.config.log_keys:
+            self.log(f"{time.time():.3f}s MANUAL key={key.upper()} {action} L={self.state.left:+.2f} R={self.state.right:+.2f}")
+
+    def _write(self, now:float, period:float):
+        state = self.state
+        self.ctrl.setValues({"left_speed": state.left, "right_speed": state.right})
+        state.next_time = now + period
+        if self.config.hud and now - state.last_hud > 0.3:
+            auto_flag = "LOCKED" if state.auto_blocked else "OK"
+            print(f"{self._prefix}[{state.mode} | AUTO:{auto_flag}] L={state.left:+.2f} R={state.right:+.2f}  "
+                  f"sensor={self.ctrl.getValue('sensor')}   ", end="\r")
+            state.last_hud = now
+
+
+class ControlEngine:
+    """Steps every robot when its period is due, on one RateLoop of period tick."""
+
+    def __init__(self, configs:list, tick:float=None, keyboard=None):
+        assert configs, "No robots configured!"
+        self.robots = [Robot(config, shared_name=len(configs) > 1) for config in configs]
+        self.tick = tick or min(min(config.manual_dt, config.auto_dt) for config in configs)
+        self._keyboard = keyboard
+        self._loop = None
+
+    @classmethod
+    def fromFile(cls, path:str, keyboard=None):
+        with open(path) as f:
+            settings = json.load(f)
+        configs = [RobotConfig(**robot) for robot in settings["robots"]]
+        return cls(configs, settings.get("tick", None), keyboard)
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.stop()
+
+    def run(self):
+        if self._keyboard is None and any(robot.config.keyboard for robot in self.robots):
+            self._keyboard = openKeyboard()
+        if self._keyboard is not None:
+            self._keyboard.start()
+        for robot in self.robots:
+            robot.start()
+        # Keys not consumed yet (a robot in an override sequence), per robot
+        backlog = {robot: [] for robot in self.robots}
+        self._loop = RateLoop(self.tick, name="control engine")
+        try:
+            for tick in self._loop:
+                keys = self._keyboard.keys() if self._keyboard is not None else []
+                now = time.perf_counter()
+                for robot in self.robots:
+                    if robot.config.keyboard:
+                        backlog[robot].extend(keys)
+                    if robot.due(now):
+                        backlog[robot] = robot.step(now, backlog[robot])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self._keyboard is not None:
+                self._keyboard.close()
+            for robot in self.robots:
+                robot.stop()
+            print("\nStopped.")
+
+
+if __name__ == "__main__":
+    ControlEngine.fromFile(sys.argv[1]).run()
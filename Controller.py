@@ -1,9 +1,17 @@
 import threading
 import socket
+import selectors
 import json
+import struct
+from array import array
+from collections import namedtuple
+from itertools import chain
+from operator import itemgetter
 from enum import Enum
 import time
 import logging
+import os
+from bisect import bisect_left
 
 
 class DataType(str, Enum):
@@ -27,129 +35,1385 @@ def bitLength(datatype):
         return 64
     else:
         return 0
-        
 
-class UDP_Controller(threading.Thread):
 
-    def __init__(self, ip:str="0.0.0.0", port:int=8400, max_size:int=1024, log_lever=logging.INFO):
+# Bit tables: byte value -> its 8 bits (most significant first) and back
+_BYTE_BITS = tuple(tuple(bool((b >> (7 - i)) & 1) for i in range(8)) for b in range(256))
+_BITS_BYTE = {bits: b for b, bits in enumerate(_BYTE_BITS)}
+
+def valueToBits(value:int, datatype:DataType) -> list:
+    """Bits of value, most significant first, as returned by getMappedValue."""
+    if datatype == DataType.BYTE:
+        return list(_BYTE_BITS[value])
+    return list(chain.from_iterable(_BYTE_BITS[b] for b in value.to_bytes(bitLength(datatype) // 8, 'big')))
+
+def bitsToValue(bits:list) -> int:
+    """Inverse of valueToBits. Any number of bits, most significant first; only True (or 1) is a set bit."""
+    bits = tuple(bit == True for bit in bits)
+    padding = -len(bits) % 8
+    if padding:
+        bits = (False,) * padding + bits
+    return int.from_bytes(bytes(_BITS_BYTE[bits[i:i+8]] for i in range(0, len(bits), 8)), 'big')
+
+def toBool(value:any) -> bool:
+    if isinstance(value, bool):
+        return value
+    elif isinstance(value, str):
+        return value == 'True'
+    else:
+        return False
+
+# Conversion applied to every value written to a variable of each type
+_CONVERTERS = {
+    DataType.BOOL: toBool,
+    DataType.BYTE: int,
+    DataType.WORD: int,
+    DataType.DWORD: int,
+    DataType.QWORD: int,
+    DataType.INT: int,
+    DataType.FLOAT: float,
+    DataType.STRING: str,
+    }
+
+# Numeric types are stored in one contiguous array per type; BOOL and STRING in plain lists
+_ARRAY_TYPECODES = {
+    DataType.BYTE: 'B',
+    DataType.WORD: 'H',
+    DataType.DWORD: 'I',
+    DataType.QWORD: 'Q',
+    DataType.INT: 'q',
+    DataType.FLOAT: 'd',
+    }
+
+# Value range of each integer column, checked before a value is written
+_INT_RANGES = {}
+for _datatype, _typecode in _ARRAY_TYPECODES.items():
+    if _typecode != 'd':
+        _bits = array(_typecode).itemsize * 8
+        _INT_RANGES[_datatype] = (-(1 << (_bits - 1)), (1 << (_bits - 1)) - 1) if _typecode.islower() else (0, (1 << _bits) - 1)
+
+
+def parseFloats(text:str) -> tuple:
+    """Parser for vectors like "[24,0,0]" (brackets optional): a tuple of floats, () if empty."""
+    text = text.strip()
+    if text[:1] in ("[", "(") and text[-1:] in ("]", ")"):
+        text = text[1:-1]
+    if not text.strip():
+        return ()
+    return tuple(float(item) for item in text.split(","))
+
+def parseBits(width:int):
+    """Parser for bit strings like "01000000": a tuple of width 0/1 ints, cut or padded with 0 on the right."""
+    def parse(text:str) -> tuple:
+        return tuple(1 if char == "1" else 0 for char in text[:width].ljust(width, "0"))
+    return parse
+
+def parseJson(text:str):
+    """Parser for JSON text; None if empty. The result is shared, do not modify it."""
+    return json.loads(text) if text else None
+
+
+class Variable:
+    """
+    Descriptor of one controller variable. Its value lives at column[slot] in the column of its type.
+    A structured variable also has a parser, run once per change, and keeps its result in parsed.
+    """
+    __slots__ = ("name", "datatype", "convert", "column", "slot", "parser", "parsed")
+
+    def __init__(self, name:str, datatype:DataType, column, slot:int, parser=None):
+        self.name = name
+        self.datatype = datatype
+        self.convert = _CONVERTERS[datatype]
+        self.column = column
+        self.slot = slot
+        self.parser = parser
+        self.parsed = parser(column[slot]) if parser is not None else None
+
+    @property
+    def value(self):
+        return self.column[self.slot]
+
+    @property
+    def current(self):
+        """What getValue returns: the parsed value of a structured variable, else the value itself."""
+        return self.column[self.slot] if self.parser is None else self.parsed
+
+
+class SendPolicy:
+    """Outbound filter of one variable: deadband against the last sent value and a minimum send interval."""
+    __slots__ = ("deadband", "relative", "min_interval", "last_time")
+
+    def __init__(self, deadband:float=0.0, relative:bool=False, max_rate:float=None):
+        self.deadband = deadband
+        self.relative = relative
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.last_time = float("-inf")
+
+    def withinDeadband(self, value:any, last_sent:any) -> bool:
+        if not self.deadband or last_sent is None:
+            return False
+        if value == 0:
+            # Settling at exactly zero (e.g. a stop) is always sent
+            return last_sent == 0
+        try:
+            difference = abs(value - last_sent)
+        except TypeError:
+            return False
+        limit = self.deadband * abs(last_sent) if self.relative else self.deadband
+        return difference <= limit
+
+
+class Subscription:
+    """
+    One subscribe() registration. Edge subscriptions ("rising"/"falling") keep the last
+    predicate(value) in level; plain ones (edge None) fire on every change.
+    """
+    __slots__ = ("name", "callback", "edge", "predicate", "level")
+
+    def __init__(self, name:str, callback, edge:str=None, predicate=bool, level:bool=False):
+        self.name = name
+        self.callback = callback
+        self.edge = edge
+        self.predicate = predicate
+        self.level = level
+
+    def fires(self, value:any) -> bool:
+        if self.edge is None:
+            return True
+        level = bool(self.predicate(value))
+        if level == self.level:
+            return False
+        self.level = level
+        return level == (self.edge == "rising")
+
+
+# Sessions not heard from for this long (seconds) are evicted, see setSessionTimeout
+SESSION_TIMEOUT = 30.0
+# A new client takes over as primary once the primary has been silent this long (e.g. a restarted sim)
+PRIMARY_TAKEOVER = 1.0
+# Peers served at once; the least recently seen non-primary session makes room for a new one
+MAX_SESSIONS = 16
+# States of the link to the primary client, passed to the connection callbacks (see setHeartbeat)
+CONNECTED = "connected"
+LOST = "lost"
+DISCONNECTED = "disconnected"
+# Weight of a new sample in the smoothed round-trip time (as TCP's SRTT)
+RTT_GAIN = 0.125
+
+
+class Session:
+    """
+    One peer of the controller, with its own binary codec and queue of updates to send. The primary
+    session (the sim) also gets acknowledged critical writes. Every other session gets the outbound
+    updates fanned out into its pending queue. Observers (handshake with "observe": 1) are read-only
+    and also get the inbound changes, to monitor the whole I/O map.
+    """
+    __slots__ = ("address", "observer", "codec", "reliable", "pending", "last_seen")
+
+    def __init__(self, address, observer:bool, now:float):
+        self.address = address
+        self.observer = observer
+        self.codec = None
+        self.reliable = False
+        self.pending = {}
+        self.last_seen = now
+
+    def take(self) -> dict:
+        pending, self.pending = self.pending, {}
+        return pending
+
+
+# Upper bounds (microseconds) of the network loop iteration time histogram
+ITERATION_BUCKETS_US = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf"))
+
+
+class StatsExporter(threading.Thread):
+    """
+    Periodically writes controller.stats() to a file: one JSON line appended per interval
+    (format="json"), or a Prometheus text exposition file replaced atomically (format="prometheus").
+    """
+
+    def __init__(self, controller, path:str, interval:float=10.0, format:str="json"):
+        assert format in ("json", "prometheus"), f"Unknown stats format {format}!"
+        threading.Thread.__init__(self, name="Simumatik Controller Stats", daemon=True)
+        self._controller = controller
+        self._path = path
+        self._interval = interval
+        self._format = format
+        self._stop = threading.Event()
+
+    def close(self):
+        self._stop.set()
+
+    def run(self):
+        while not self._stop.wait(self._interval):
+            self.export()
+
+    def export(self):
+        stats = self._controller.stats()
+        try:
+            if self._format == "json":
+                with open(self._path, "a") as f:
+                    f.write(json.dumps({"time": time.time(), **stats}) + "\n")
+            else:
+                tmp_path = self._path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(prometheusText(stats, {"port": str(self._controller._port)}))
+                os.replace(tmp_path, self._path)
+        except OSError as e:
+            logging.warning(f"Stats export to {self._path} failed: {e}")
+
+
+def prometheusText(stats:dict, labels:dict, prefix:str="simumatik_controller") -> str:
+    """Render the result of stats() in the Prometheus text exposition format."""
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    lines = []
+    for key, value in stats.items():
+        if key == "iteration_us":
+            name = f"{prefix}_iteration_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(ITERATION_BUCKETS_US, value["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound / 1e6)
+                lines.append(f'{name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label_text}}} {value['sum'] / 1e6}")
+            lines.append(f"{name}_count{{{label_text}}} {value['count']}")
+        elif key == "rtt_ms":
+            name = f"{prefix}_rtt_seconds"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{{{label_text}}} {value / 1e3}")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            gauge = key in ("pending", "pending_max", "sessions")
+            name = f"{prefix}_{key}" if gauge else f"{prefix}_{key}_total"
+            lines.append(f"# TYPE {name} {'gauge' if gauge else 'counter'}")
+            lines.append(f"{name}{{{label_text}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# Binary framing, negotiated per peer: the peer adds "binary": 1 to a poll, the controller answers
+# (in JSON) with the variable table [[name, datatype], ...] and from then on both sides may send
+# frames of: magic byte, flags byte, [uint32 poll], then (uint16 index, packed value) pairs.
+BINARY_MAGIC = 0xB5
+BINARY_VERSION = 1
+_BINARY_MAGIC_BYTE = bytes((BINARY_MAGIC,))
+_BINARY_FLAG_POLL = 0x01
+_BINARY_HEADER = struct.Struct('<BB')
+_BINARY_POLL = struct.Struct('<I')
+_BINARY_INDEX = struct.Struct('<H')
+_BINARY_STRLEN = struct.Struct('<H')
+_BINARY_FORMATS = {
+    DataType.BOOL: '<?',
+    DataType.BYTE: '<B',
+    DataType.WORD: '<H',
+    DataType.DWORD: '<I',
+    DataType.QWORD: '<Q',
+    DataType.INT: '<q',
+    DataType.FLOAT: '<d',
+    DataType.STRING: None,
+    }
+
+
+class BinaryCodec:
+    """Packs variable updates by index using a variable table both peers agreed on."""
+
+    def __init__(self, table:list):
+        self._names = []
+        self._datatypes = []
+        self._index = {}
+        self._structs = []
+        for name, datatype in table:
+            datatype = DataType(datatype)
+            fmt = _BINARY_FORMATS[datatype]
+            self._index[name] = len(self._names)
+            self._names.append(name)
+            self._datatypes.append(datatype)
+            self._structs.append(struct.Struct(fmt) if fmt else None)
+
+    def table(self) -> list:
+        return [[name, datatype.value] for name, datatype in zip(self._names, self._datatypes)]
+
+    def encode(self, data:dict) -> bytes:
+        flags = 0
+        parts = []
+        poll = data.get("poll", None)
+        if poll:
+            flags |= _BINARY_FLAG_POLL
+            parts.append(_BINARY_POLL.pack(int(poll) & 0xFFFFFFFF))
+        for name, value in data.items():
+            if name == "poll":
+                continue
+            index = self._index[name]
+            parts.append(_BINARY_INDEX.pack(index))
+            packer = self._structs[index]
+            if packer is None:
+                raw = str(value).encode('utf-8')
+                parts.append(_BINARY_STRLEN.pack(len(raw)))
+                parts.append(raw)
+            else:
+                parts.append(packer.pack(value))
+        return _BINARY_HEADER.pack(BINARY_MAGIC, flags) + b''.join(parts)
+
+    def decode(self, data:bytes) -> dict:
+        magic, flags = _BINARY_HEADER.unpack_from(data, 0)
+        if magic != BINARY_MAGIC:
+            raise ValueError("Not a binary frame")
+        offset = _BINARY_HEADER.size
+        result = {}
+        if flags & _BINARY_FLAG_POLL:
+            result["poll"] = _BINARY_POLL.unpack_from(data, offset)[0] or 1
+            offset += _BINARY_POLL.size
+        size = len(data)
+        try:
+            while offset < size:
+                index = _BINARY_INDEX.unpack_from(data, offset)[0]
+                offset += _BINARY_INDEX.size
+                unpacker = self._structs[index]
+                if unpacker is None:
+                    length = _BINARY_STRLEN.unpack_from(data, offset)[0]
+                    offset += _BINARY_STRLEN.size
+                    value = str(data[offset:offset+length], 'utf-8')
+                    offset += length
+                else:
+                    value = unpacker.unpack_from(data, offset)[0]
+                    offset += unpacker.size
+                result[self._names[index]] = value
+        except (IndexError, struct.error) as e:
+            raise ValueError(f"Truncated binary frame: {e}")
+        return result
+
+
+# Datagrams read per wake-up before they are handled
+RX_RING_SLOTS = 32
+
+
+class ReceiveRing:
+    """
+    Preallocated receive buffers. fill() reads a batch of datagrams with recvfrom_into, one per slot,
+    and datagram(i) returns a memoryview of slot i, so nothing is allocated per packet for the payload.
+    The views are only valid until the next fill().
+    """
+
+    def __init__(self, max_size:int, slots:int=RX_RING_SLOTS):
+        self._buffer = bytearray(max_size * slots)
+        view = memoryview(self._buffer)
+        self._slots = [view[i*max_size:(i+1)*max_size] for i in range(slots)]
+        self.sizes = [0] * slots
+        self.addresses = [None] * slots
+
+    def fill(self, _socket, _stats:dict) -> int:
+        """Read up to one datagram per slot from a non-blocking socket. Returns the number read."""
+        count = 0
+        while count < len(self._slots):
+            try:
+                self.sizes[count], self.addresses[count] = _socket.recvfrom_into(self._slots[count])
+            except BlockingIOError:
+                break
+            except OSError as e:
+                # e.g. ICMP port unreachable reported as ConnectionResetError on Windows
+                logging.debug(f"Receive error: {e}")
+                _stats["receive_errors"] += 1
+                continue
+            count += 1
+        return count
+
+    def datagram(self, index:int) -> memoryview:
+        return self._slots[index][:self.sizes[index]]
+
+
+# Batch plans cached per controller, keyed by the names of the batch; bounded, since a peer can send any names
+BATCH_PLAN_CACHE = 256
+# Below this many values of one type, converting value by value is cheaper than building an array
+BATCH_GROUP_MIN = 8
+
+
+class BatchPlan:
+    """
+    How to convert one set of names (a setValues batch or an inbound datagram): the variables grouped
+    by DataType, with one itemgetter per group. A large numeric group is converted and range-checked
+    by a single array() call, the rest value by value. Names that are not variables are kept in unknown.
+    structured is True if any of the variables has a parser.
+    """
+    __slots__ = ("groups", "unknown", "structured")
+
+    def __init__(self, variables:dict, names:tuple):
+        by_type = {}
+        self.unknown = []
+        for name in names:
+            variable = variables.get(name, None)
+            if variable is None:
+                self.unknown.append(name)
+            else:
+                by_type.setdefault(variable.datatype, []).append(variable)
+        self.structured = any(variable.parser is not None for group in by_type.values() for variable in group)
+        self.groups = []
+        for datatype, group in by_type.items():
+            typecode = _ARRAY_TYPECODES.get(datatype, None) if len(group) >= BATCH_GROUP_MIN else None
+            getter = itemgetter(*[variable.name for variable in group]) if typecode is not None else None
+            self.groups.append((typecode, getter, group, _INT_RANGES.get(datatype, None)))
+
+    def convert(self, values:dict, invalid:list=None) -> list:
+        """
+        (variable, converted value) pairs, grouped by type. A value that does not convert raises, or,
+        if invalid is given, is left out and (name, error) is appended to invalid.
+        """
+        converted = []
+        for typecode, getter, group, limits in self.groups:
+            if typecode is not None:
+                try:
+                    converted.extend(zip(group, array(typecode, getter(values))))
+                    continue
+                except (TypeError, OverflowError):
+                    # e.g. "12" or 1.5 for an integer type: convert value by value, as setValue does
+                    pass
+            for variable in group:
+                try:
+                    value = variable.convert(values[variable.name])
+                    if limits is not None and not limits[0] <= value <= limits[1]:
+                        raise ValueError(f"{variable.name}: {value} out of range for {variable.datatype.value}")
+                except (ValueError, TypeError) as e:
+                    if invalid is None:
+                        raise
+                    invalid.append((variable.name, e))
+                    continue
+                converted.append((variable, value))
+        return converted
+
+
+class ControllerBase:
+    """
+    Variable table and Simumatik JSON protocol shared by the controller transports.
+
+    Concurrency model: variable values and the outbound buffer are guarded by one lock, taken by the
+    user thread in setValue/getValues and by the network thread once per received datagram. A whole
+    datagram is therefore applied atomically, and getValues returns a consistent snapshot. Writes
+    are coalesced per variable until the network thread swaps the buffer out (last value wins).
+
+    Sessions: every peer address gets a Session. The first client is the primary (see Session), a
+    second sim or a monitoring tool is served alongside it instead of taking its place, and idle
+    sessions are evicted. Sessions are only touched by the network thread.
+
+    Liveness: with setHeartbeat, the network thread polls the primary client and tracks the state
+    of the link to it (connection callbacks, failsafe values on loss) within its usual wake-ups.
+    """
+
+    def __init__(self, ip:str="0.0.0.0", port:int=8400, max_size:int=1024, log_lever=logging.INFO, allow_binary:bool=True):
         logging.basicConfig(level=log_lever, format='%(asctime)-15s %(levelname)s %(name)s: %(message)s')
         self._ip = ip
         self._port = port
         self._max_size = max_size
+        self._allow_binary = allow_binary
         self._client_address = None
+        self._sessions = {}
+        self._session = None
+        self._secondary = ()
+        self._observers = ()
+        self._session_timeout = SESSION_TIMEOUT
+        self._next_eviction = 0.0
+        self._heartbeat = None
+        self._next_heartbeat = 0.0
+        self._ping = None
+        self._rtt = None
+        self._link_state = DISCONNECTED
+        self._connection_callbacks = ()
+        self._failsafe = None
         self._running = True
         self._variables = {}
+        self._batch_plans = {}
+        self._columns = {datatype: array(_ARRAY_TYPECODES[datatype]) if datatype in _ARRAY_TYPECODES else [] for datatype in DataType}
         self._pending2send = {}
-        threading.Thread.__init__(self, name="Simumatik Controller", daemon=True)
+        self._bit_views = {}
+        self._send_policies = {}
+        self._send_period = 0.0
+        self._next_send_time = 0.0
+        self._send_deadline = None
+        self._force_flush = False
+        self._last_sent = {}
+        self._suppressed = set()
+        self._send_stats = {"writes": 0, "values_sent": 0, "update_packets": 0, "suppressed_deadband": 0, "deferred_rate": 0,
+                            "retransmits": 0, "acks": 0, "critical_failed": 0}
+        # Network counters, only written by the network thread
+        self._net_stats = {"packets_in": 0, "bytes_in": 0, "packets_out": 0, "bytes_out": 0, "malformed": 0,
+                           "unknown_variables": 0, "invalid_values": 0, "handshake_dropped": 0, "client_changes": 0,
+                           "receive_errors": 0, "send_errors": 0, "pending_max": 0, "sessions_opened": 0,
+                           "sessions_evicted": 0, "observer_writes": 0, "heartbeats": 0, "links_lost": 0}
+        self._iteration_buckets = [0] * len(ITERATION_BUCKETS_US)
+        self._iteration_sum = 0.0
+        self._exporter = None
+        self._recorder = None
+        self._subscriptions = {}
+        self._waiting = 0
+        self._critical = {}
+        self._unconfirmed = {}
+        self._reliable = False
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._value_changed = threading.Condition(self._lock)
 
-    def close(self):
-        self._running = False
+    def _notify_pending(self):
+        """Called when setValue queues an outbound update. Transports override it to flush."""
+        pass
+
+    def _on_change(self, name:str, value:any):
+        """Called whenever a variable takes a new value (inbound or outbound)."""
+        pass
 
-    def addVariable(self, name:str, datatype:DataType, value:any):
+    def addVariable(self, name:str, datatype:DataType, value:any, parser=None):
+        """
+        With a parser (e.g. parseFloats, parseBits(8), parseJson), the variable is structured:
+        parser(value) runs once per change and getValue returns its cached result instead of the
+        raw value (see getRawValue). A value the parser rejects with ValueError/TypeError raises as the
+        initial value or from setValue/setValues (nothing is written); received from the peer, it is
+        dropped and logged, keeping the previous value, and counted in stats()["invalid_values"].
+        """
         assert name not in self._variables, f"Variable {name} already defined!"
+        assert datatype in list(DataType), f"Unknown datatype {datatype}!"
+        datatype = DataType(datatype)
         value = self.checkValue(value, datatype)
-        self._variables.update({name: {"datatype":datatype, "value":value}})
+        limits = _INT_RANGES.get(datatype, None)
+        if limits is not None and not limits[0] <= value <= limits[1]:
+            raise ValueError(f"{name}: {value} out of range for {datatype.value}")
+        with self._lock:
+            column = self._columns[datatype]
+            column.append(value)
+            try:
+                self._variables.update({name: Variable(name, datatype, column, len(column)-1, parser)})
+            except BaseException:
+                column.pop()
+                raise
+            # Plans may hold the name as unknown
+            self._batch_plans.clear()
 
     def setValue(self, name:str, new_value:any, send_update=True):
-        assert name in self._variables, f"Variable {name} is not defined!"
-        new_value = self.checkValue(new_value, self._variables[name]["datatype"])
-        if new_value != self._variables[name]["value"]:
-            self._variables[name]["value"] = new_value
+        variable = self._variables.get(name, None)
+        assert variable is not None, f"Variable {name} is not defined!"
+        new_value = variable.convert(new_value)
+        limits = _INT_RANGES.get(variable.datatype, None)
+        if limits is not None and not limits[0] <= new_value <= limits[1]:
+            raise ValueError(f"{name}: {new_value} out of range for {variable.datatype.value}")
+        with self._lock:
+            column, slot = variable.column, variable.slot
+            if new_value == column[slot]:
+                return
+            if variable.parser is not None:
+                variable.parsed = variable.parser(new_value)
+            column[slot] = new_value
+            current = variable.current
             if send_update:
-                self._pending2send.update({name:new_value})
+                self._pending2send[name] = new_value
+                self._send_stats["writes"] += 1
+            if self._waiting:
+                self._value_changed.notify_all()
+        if self._recorder is not None:
+            self._recorder.outbound(name, new_value)
+        self._on_change(name, current)
+        if send_update:
+            self._notify_pending()
+
+    def setMappedValue(self, name:str, new_value:list=None, send_update=True):
+        self.setValue(name, self._mapped_to_value(name, new_value or []), send_update)
+
+    def setMappedValues(self, values:dict, send_update=True):
+        """Write several mapped variables ({name: bits}) with a single lock acquisition and flush."""
+        self.setValues({name: self._mapped_to_value(name, bits) for name, bits in values.items()}, send_update)
 
-    def setMappedValue(self, name:str, new_value:list=[], send_update=True):
-        mapped_value = 0
-        new_value.reverse()
-        while new_value:
-            bit = 1 if new_value.pop()==True else 0
-            mapped_value = mapped_value * 2 + bit
-        self.setValue(name, mapped_value, send_update)
+    def setValues(self, values:dict, send_update=True):
+        """
+        Write several variables ({name: value}) at once. The batch is converted per DataType group,
+        all or nothing (a bad value raises before anything is written), applied under a single lock
+        acquisition and queued as one outbound update.
+        """
+        plan = self._plan(values)
+        assert not plan.unknown, f"Variable {plan.unknown[0]} is not defined!"
+        self._set_many(plan.convert(values), send_update, plan.structured)
+
+    def _plan(self, values:dict) -> BatchPlan:
+        key = tuple(values)
+        plan = self._batch_plans.get(key, None)
+        if plan is None:
+            if len(self._batch_plans) >= BATCH_PLAN_CACHE:
+                self._batch_plans.clear()
+            plan = self._batch_plans[key] = BatchPlan(self._variables, key)
+        return plan
+
+    def _mapped_to_value(self, name:str, bits:list):
+        variable = self._variables.get(name, None)
+        assert variable is not None, f"Variable {name} is not defined!"
+        if variable.datatype == DataType.BOOL:
+            return bool(bits) and bits[-1] == True
+        return bitsToValue(bits)
+
+    def _set_many(self, _converted:list, send_update=True, structured:bool=True):
+        """Apply (variable, converted value) pairs under one lock acquisition."""
+        # Parsed before anything is written: a value its parser rejects raises with the batch unapplied
+        _parsed = {variable.name: variable.parser(new_value) for variable, new_value in _converted
+                   if variable.parser is not None} if structured else None
+        _changed = []
+        with self._lock:
+            for variable, new_value in _converted:
+                column, slot = variable.column, variable.slot
+                if new_value == column[slot]:
+                    continue
+                current = new_value
+                if variable.parser is not None:
+                    current = variable.parsed = _parsed[variable.name]
+                column[slot] = new_value
+                _changed.append((variable.name, new_value, current))
+            if send_update and _changed:
+                self._pending2send.update([(name, new_value) for name, new_value, _ in _changed])
+                self._send_stats["writes"] += len(_changed)
+            if self._waiting and _changed:
+                self._value_changed.notify_all()
+        recorder, on_change = self._recorder, self._on_change
+        for name, new_value, current in _changed:
+            if recorder is not None:
+                recorder.outbound(name, new_value)
+            on_change(name, current)
+        if send_update and _changed:
+            self._notify_pending()
 
     def getValue(self, name:str):
-        assert name in self._variables, f"Variable {name} is not defined!"
-        return self._variables[name]["value"]
+        variable = self._variables.get(name, None)
+        assert variable is not None, f"Variable {name} is not defined!"
+        if variable.parser is not None:
+            return variable.parsed
+        return variable.column[variable.slot]
+
+    def getRawValue(self, name:str):
+        """The value as sent on the wire, also for structured variables."""
+        variable = self._variables.get(name, None)
+        assert variable is not None, f"Variable {name} is not defined!"
+        return variable.column[variable.slot]
+
+    def getValues(self, names:list) -> list:
+        """Consistent snapshot of several variables: no datagram is applied halfway through the read."""
+        variables = [self._variables.get(name, None) for name in names]
+        assert None not in variables, f"Variable {names[variables.index(None)]} is not defined!"
+        with self._lock:
+            return [variable.column[variable.slot] if variable.parser is None else variable.parsed for variable in variables]
 
     def getMappedValue(self, name:str):
-        value = self.getValue(name)
-        datatype = self._variables[name]["datatype"]
-        if datatype == DataType.BOOL:
+        variable = self._variables.get(name, None)
+        assert variable is not None, f"Variable {name} is not defined!"
+        return self._value_to_mapped(variable, variable.column[variable.slot])
+
+    def getMappedValues(self, names:list) -> list:
+        """Bits of several variables, read as one consistent snapshot."""
+        return [self._value_to_mapped(self._variables[name], value) for name, value in zip(names, self.getValues(names))]
+
+    def _value_to_mapped(self, variable:Variable, value):
+        if variable.datatype == DataType.BOOL:
             return [value]
-        elif datatype in [DataType.BYTE, DataType.WORD, DataType.DWORD, DataType.QWORD]:
-            bits = []
-            while value:
-                bits.append(value%2==1)
-                value = value>>1
-            bits += [False] * max(bitLength(datatype)-len(bits), 0)
-            bits.reverse()
-            return bits
+        elif variable.datatype in [DataType.BYTE, DataType.WORD, DataType.DWORD, DataType.QWORD]:
+            return valueToBits(value, variable.datatype)
         else:
-            assert False, f"Datatype {datatype} cannot be mapped!"
+            assert False, f"Datatype {variable.datatype} cannot be mapped!"
 
+    def defineBits(self, name:str, bit_names:list):
+        """
+        Name the bits of a BYTE/WORD/DWORD/QWORD (or BOOL) variable, most significant first, in the
+        same order getMappedValue returns them. Enables bits(name) and setBits(name, ...).
+        """
+        variable = self._variables.get(name, None)
+        assert variable is not None, f"Variable {name} is not defined!"
+        width = bitLength(variable.datatype) or 1
+        assert len(bit_names) == width, f"Variable {name} has {width} bits!"
+        self._bit_views[name] = namedtuple(f"{name}_bits", bit_names)
 
-    def checkValue(self, value:any, datatype:DataType):
-        if datatype == DataType.BOOL:
-            if isinstance(value, bool):
-                return value
-            elif isinstance(value, str):
-                return value == 'True'
+    def bits(self, name:str):
+        """Named snapshot of the bits of a variable, e.g. ctrl.bits("digital_inputs1").Toggle_Sw"""
+        assert name in self._bit_views, f"No bit names defined for {name}!"
+        return self._bit_views[name]._make(self.getMappedValue(name))
+
+    def setBits(self, name:str, send_update=True, **bits):
+        """Change only the named bits of a variable, e.g. ctrl.setBits("digital_outputs1", Motor=True)"""
+        assert name in self._bit_views, f"No bit names defined for {name}!"
+        with self._lock:
+            current = self._bit_views[name]._make(self._value_to_mapped(self._variables[name], self._variables[name].value))
+        self.setMappedValue(name, list(current._replace(**bits)), send_update)
+
+    def setSendPolicy(self, name:str, deadband:float=0.0, relative:bool=False, max_rate:float=None):
+        """
+        Filter outbound updates of a variable: changes within deadband of the last sent value are not
+        sent (relative=True makes deadband a fraction of that value), and at most max_rate updates per
+        second are sent (the latest value goes out when the interval has passed).
+        """
+        assert name in self._variables, f"Variable {name} is not defined!"
+        self._send_policies[name] = SendPolicy(deadband, relative, max_rate)
+
+    def setSendPeriod(self, period:float):
+        """Aggregate all pending changes into at most one outbound packet every period seconds (0 = no limit)."""
+        self._send_period = period
+
+    def setCritical(self, name:str, retries:int=5, retry_interval:float=0.05):
+        """
+        Mark a variable as critical (e.g. wheel speeds that must reach zero on exit). Every update of it
+        is sent with a sequence number to peers that negotiated acks ("reliable": 1 in a poll) and
+        retransmitted every retry_interval until acknowledged, at most retries times. Peers without
+        acks get the value repeated retries times instead.
+        """
+        assert name in self._variables, f"Variable {name} is not defined!"
+        self._critical[name] = (retries, retry_interval)
+
+    def flush(self, timeout:float=0.0) -> bool:
+        """
+        Send every pending change now, including deadband-suppressed ones, bypassing policies and period.
+        With a timeout, block until critical variables are confirmed; returns False if they were not.
+        Do not call with a timeout from the network thread itself.
+        """
+        with self._lock:
+            for name in self._suppressed:
+                self._pending2send.setdefault(name, self._variables[name].value)
+            self._suppressed.clear()
+            self._force_flush = True
+            failed = self._send_stats["critical_failed"]
+        self._notify_pending()
+        with self._lock:
+            if timeout > 0:
+                drained = self._drained.wait_for(self._is_drained, timeout)
             else:
-                return False
-        elif datatype in [DataType.BYTE, DataType.WORD, DataType.DWORD, DataType.QWORD, DataType.INT]:
-            return int(value)
-        elif datatype == DataType.FLOAT:
-            return float(value)
+                # The flush itself is still queued: only report critical writes not confirmed yet
+                drained = self._critical_drained()
+            return drained and self._send_stats["critical_failed"] == failed
+
+    def _is_drained(self) -> bool:
+        # Called with the lock held
+        if self._force_flush and self._sessions:
+            return False
+        return self._critical_drained()
+
+    def _critical_drained(self) -> bool:
+        # Called with the lock held
+        if not self._sessions:
+            # No peer to send to (none connected yet, or all evicted): nothing to wait for
+            return True
+        if self._unconfirmed:
+            return False
+        return not any(name in self._pending2send for name in self._critical)
+
+    def _notify_drained(self):
+        """Called with the lock held whenever critical variables may have become confirmed."""
+        self._drained.notify_all()
+
+    def sendStats(self) -> dict:
+        with self._lock:
+            stats = dict(self._send_stats)
+        stats["packets_saved"] = max(0, stats["writes"] - stats["update_packets"])
+        return stats
+
+    def stats(self) -> dict:
+        """Network and send counters, current outbound queue depth and the loop iteration time histogram."""
+        stats = dict(self._net_stats)
+        stats["pending"] = len(self._pending2send)
+        stats["sessions"] = len(self._sessions)
+        if self._rtt is not None:
+            stats["rtt_ms"] = round(self._rtt * 1000, 3)
+        stats.update(self.sendStats())
+        buckets = list(self._iteration_buckets)
+        stats["iteration_us"] = {"buckets": buckets, "sum": round(self._iteration_sum, 1), "count": sum(buckets)}
+        return stats
+
+    def exportStats(self, path:str, interval:float=10.0, format:str="json") -> StatsExporter:
+        """Write stats() every interval seconds, as JSON lines or as a Prometheus text file."""
+        if self._exporter is not None:
+            self._exporter.close()
+        self._exporter = StatsExporter(self, path, interval, format)
+        self._exporter.start()
+        return self._exporter
+
+    def setRecorder(self, recorder):
+        """Stream every variable change, inbound and outbound, to recorder (see Telemetry.py). None stops."""
+        if recorder is not None:
+            recorder.attach(self)
+        self._recorder = recorder
+
+    def subscribe(self, name:str, callback, edge:str=None, predicate=bool) -> Subscription:
+        """
+        Call callback(name, value) whenever a received datagram changes variable name; value is what
+        getValue returns (parsed, for structured variables). With edge="rising" ("falling"), only
+        when predicate(value) becomes true (false). Callbacks run on the network thread, after the
+        datagram is applied, and must not block. Local setValue writes do not fire subscriptions.
+        """
+        variable = self._variables.get(name, None)
+        assert variable is not None, f"Variable {name} is not defined!"
+        assert edge in (None, "rising", "falling"), f"Unknown edge {edge}!"
+        with self._lock:
+            level = bool(predicate(variable.current)) if edge is not None else False
+            subscription = Subscription(name, callback, edge, predicate, level)
+            # Copy on write: the network thread iterates the tuple without the lock
+            self._subscriptions[name] = self._subscriptions.get(name, ()) + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription:Subscription):
+        with self._lock:
+            remaining = tuple(s for s in self._subscriptions.get(subscription.name, ()) if s is not subscription)
+            if remaining:
+                self._subscriptions[subscription.name] = remaining
+            else:
+                self._subscriptions.pop(subscription.name, None)
+
+    def waitFor(self, name:str, predicate, timeout:float=None) -> bool:
+        """
+        Block until predicate(value of name) is true; returns False on timeout. The predicate is only
+        re-evaluated when a variable changes (received or written), not polled. Do not call from the
+        network thread or from a subscriber.
+        """
+        variable = self._variables.get(name, None)
+        assert variable is not None, f"Variable {name} is not defined!"
+        with self._lock:
+            self._waiting += 1
+            try:
+                return bool(self._value_changed.wait_for(lambda: predicate(variable.current), timeout))
+            finally:
+                self._waiting -= 1
+
+    def setHeartbeat(self, interval:float=0.5, timeout:float=2.0):
+        """
+        Monitor the link to the primary client: poll it every interval seconds and declare the link
+        lost once nothing has been received from it for timeout seconds (see addConnectionCallback
+        and setFailsafe). The polls carry a millisecond timestamp; a peer answering with
+        "pong": <that value> gives rtt(). interval=None stops the monitor.
+        """
+        assert interval is None or 0 < interval < timeout, "The heartbeat interval must be shorter than the timeout!"
+        self._heartbeat = None if interval is None else (interval, timeout)
+        self._next_heartbeat = 0.0
+        self._ping = None
+        # The network thread schedules the first heartbeat
+        self._notify_pending()
+
+    def setFailsafe(self, values:dict):
+        """Values written by the network thread as soon as the link is lost, e.g. {"left_speed": 0.0}. None: no failsafe."""
+        if values is not None:
+            plan = self._plan(values)
+            assert not plan.unknown, f"Variable {plan.unknown[0]} is not defined!"
+            # Converted (and checked) here: the network thread only applies them
+            values = plan.convert(values)
+        self._failsafe = values
+
+    def addConnectionCallback(self, callback):
+        """
+        Call callback(state, address) on the network thread when the link to the primary client
+        changes state: CONNECTED, LOST (heartbeat timeout, see setHeartbeat) or DISCONNECTED (evicted).
+        """
+        self._connection_callbacks = self._connection_callbacks + (callback,)
+
+    def linkState(self) -> str:
+        return self._link_state
+
+    def rtt(self) -> float:
+        """Smoothed round-trip time (seconds) of the heartbeats, None until the peer has answered one."""
+        return self._rtt
+
+    def _set_link_state(self, state:str):
+        if state == self._link_state:
+            return
+        self._link_state = state
+        address = self._client_address
+        if state == LOST:
+            self._net_stats["links_lost"] += 1
+            logging.warning(f"Link to {address} lost")
+            if self._failsafe:
+                self._set_many(self._failsafe)
         else:
-            return str(value)
+            logging.info(f"Link to {address} {state}")
+        for callback in self._connection_callbacks:
+            try:
+                callback(state, address)
+            except Exception:
+                logging.exception(f"Connection callback {callback} failed")
 
-    def run(self):
-        _socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        _socket.bind((self._ip, self._port))
-        _socket.settimeout(0)
-        logging.info(f"Controller UDP server listening: {self._ip}: {self._port}")
-        
-        while self._running:
+    def _check_link(self, _send_data:dict, now:float, interval:float, timeout:float) -> float:
+        """Heartbeat and loss detection for the primary client; returns when to check again."""
+        last_seen = self._session.last_seen
+        if self._link_state == CONNECTED and now - last_seen >= timeout:
+            self._set_link_state(LOST)
+        if now >= self._next_heartbeat:
+            stamp = int(now * 1000) & 0xFFFFFFFF
+            _send_data["poll"] = stamp
+            self._ping = (stamp, now)
+            self._next_heartbeat = now + interval
+            self._net_stats["heartbeats"] += 1
+        if self._link_state == CONNECTED:
+            return min(self._next_heartbeat, last_seen + timeout)
+        return self._next_heartbeat
+
+    def _pong(self, stamp:any, now:float):
+        if self._ping is not None and stamp == self._ping[0]:
+            sample = now - self._ping[1]
+            self._rtt = sample if self._rtt is None else self._rtt + RTT_GAIN * (sample - self._rtt)
+            self._ping = None
+
+    def _record_iteration(self, seconds:float):
+        microseconds = seconds * 1e6
+        self._iteration_buckets[bisect_left(ITERATION_BUCKETS_US, microseconds)] += 1
+        self._iteration_sum += microseconds
+
+    def checkValue(self, value:any, datatype:DataType):
+        return _CONVERTERS[DataType(datatype)](value)
+
+    def _receive(self, _data:bytes, _addr) -> dict:
+        """Handle one inbound datagram and return the data to reply to _addr with (may be empty)."""
+        self._net_stats["packets_in"] += 1
+        self._net_stats["bytes_in"] += len(_data)
+        now = time.perf_counter()
+        session = self._sessions.get(_addr, None)
+        if session is not None:
+            session.last_seen = now
+        if now >= self._next_eviction:
+            self._evict(now)
+        try:
+            _recv_data = self._decode(_data, session.codec if session is not None else None)
+        except ValueError:
+            logging.debug(f"Malformed datagram from {_addr}")
+            self._net_stats["malformed"] += 1
+            _recv_data = None
+
+        if session is None:
+            return self._open_session(_addr, _recv_data, now)
+
+        if not isinstance(_recv_data, dict):
+            return {}
+        logging.debug(f"Data received: {_recv_data}")
+
+        if session is not self._session and not session.observer and self._primary_silent(now):
+            self._promote(session)
+        primary = session is self._session
+        if primary and self._link_state != CONNECTED:
+            self._set_link_state(CONNECTED)
+
+        _send_data = {}
+        if _recv_data:
+            if _recv_data.get("poll", None):
+                _recv_data.pop("poll")
+                _send_data.update({"poll":int(time.perf_counter())})
+                if "binary" in _recv_data:
+                    _send_data.update(self._negotiate_binary(session, _recv_data.pop("binary")))
+                if _recv_data.pop("reliable", None) and primary:
+                    _send_data.update(self._negotiate_reliable())
+            _recv_data.pop("observe", None)
+            if "pong" in _recv_data:
+                _stamp = _recv_data.pop("pong")
+                if primary:
+                    self._pong(_stamp, now)
+            if "ack" in _recv_data:
+                _seq = _recv_data.pop("ack")
+                if primary:
+                    self._acknowledge(_seq)
+
+            if not session.observer:
+                self._apply_received(_recv_data)
+            elif _recv_data:
+                self._net_stats["observer_writes"] += len(_recv_data)
+
+        if primary:
+            return self._collect_pending(_send_data)
+        _send_data.update(session.take())
+        return _send_data
+
+    def _open_session(self, _addr, _recv_data:any, now:float) -> dict:
+        """A new peer: its first datagram is answered with a poll (and handshake fields) and otherwise dropped."""
+        self._net_stats["sessions_opened"] += 1
+        self._net_stats["handshake_dropped"] += 1
+        if len(self._sessions) >= MAX_SESSIONS:
+            self._evict(now, make_room=True)
+        observer = isinstance(_recv_data, dict) and bool(_recv_data.get("observe", None))
+        session = Session(_addr, observer, now)
+        self._sessions[_addr] = session
+        _send_data = {"poll":int(time.perf_counter())}
+        if observer:
+            logging.info(f"Observer connected: {_addr}")
+            _send_data["observe"] = 1
+            # Start from a full snapshot, sent with the next outbound flush
+            with self._lock:
+                session.pending.update((name, variable.value) for name, variable in self._variables.items())
+        elif self._session is None or self._primary_silent(now):
+            self._promote(session)
+        else:
+            logging.info(f"Additional client connected: {_addr}")
+        self._update_sessions()
+        if isinstance(_recv_data, dict):
+            if _recv_data.get("binary", None):
+                _send_data.update(self._negotiate_binary(session, _recv_data["binary"]))
+            if _recv_data.get("reliable", None) and session is self._session:
+                _send_data.update(self._negotiate_reliable())
+        return _send_data
 
-            _recv_data = {}
-            _send_data = {}
-            _addr = None
+    def _primary_silent(self, now:float) -> bool:
+        return self._session is None or now - self._session.last_seen >= PRIMARY_TAKEOVER
 
+    def _promote(self, session:Session):
+        """Make session the primary client, the one critical writes are acknowledged by."""
+        if self._session is not None:
+            logging.info(f"Client address changed from {self._session.address} to {session.address}")
+        self._net_stats["client_changes"] += 1
+        self._session = session
+        self._client_address = session.address
+        self._reliable = session.reliable
+        self._ping = None
+        self._update_sessions()
+        self._set_link_state(CONNECTED)
+
+    def _update_sessions(self):
+        # Tuples rebuilt on every change, so the send paths iterate them as they are
+        self._secondary = tuple(session for session in self._sessions.values() if session is not self._session)
+        self._observers = tuple(session for session in self._secondary if session.observer)
+
+    def _evict(self, now:float, make_room:bool=False):
+        """Drop the sessions idle for longer than the session timeout (and, to make room, the least recently seen one)."""
+        self._next_eviction = now + 1.0
+        timeout = self._session_timeout
+        evicted = [session for session in self._sessions.values() if timeout is not None and now - session.last_seen > timeout]
+        if make_room and len(self._sessions) - len(evicted) >= MAX_SESSIONS:
+            candidates = [session for session in self._secondary if session not in evicted]
+            evicted.append(min(candidates, key=lambda session: session.last_seen))
+        if not evicted:
+            return
+        for session in evicted:
+            del self._sessions[session.address]
+            self._net_stats["sessions_evicted"] += 1
+            logging.info(f"Session {session.address} evicted after {now - session.last_seen:.1f}s without traffic")
+        if self._session in evicted:
+            writers = [session for session in self._sessions.values() if not session.observer]
+            if not writers:
+                self._set_link_state(DISCONNECTED)
+            self._session = None
+            self._client_address = None
+            self._reliable = False
+            if writers:
+                self._promote(max(writers, key=lambda session: session.last_seen))
+        self._update_sessions()
+
+    def setSessionTimeout(self, seconds:float):
+        """Evict peers not heard from for seconds (None: never). Default SESSION_TIMEOUT."""
+        self._session_timeout = seconds
+
+    def sessions(self) -> list:
+        """[(address, role, seconds since its last datagram)] of the connected peers; role is "primary", "client" or "observer"."""
+        now = time.perf_counter()
+        return [(session.address, "primary" if session is self._session else "observer" if session.observer else "client",
+                 now - session.last_seen) for session in list(self._sessions.values())]
+
+    def _outbound(self) -> list:
+        """
+        [(address, data)] to send now: the pending changes and critical retransmissions for the primary
+        client, and the updates queued for each other session.
+        """
+        if not self._sessions:
+            return []
+        now = time.perf_counter()
+        if now >= self._next_eviction:
+            self._evict(now)
+        packets = []
+        _send_data = self._collect_pending({})
+        if _send_data and self._client_address is not None:
+            packets.append((self._client_address, _send_data))
+        for session in self._secondary:
+            if session.pending:
+                packets.append((session.address, session.take()))
+        return packets
+
+    def _apply_received(self, _recv_data:dict):
+        """
+        Apply all values of one inbound datagram under a single lock acquisition. Values are converted
+        per DataType group beforehand; unknown variables and invalid values are skipped and counted.
+        """
+        plan = self._plan(_recv_data)
+        for var_name in plan.unknown:
+            logging.debug(f"Ignored unknown variable {var_name}")
+            self._net_stats["unknown_variables"] += 1
+        _invalid = []
+        _converted = plan.convert(_recv_data, _invalid)
+        _changed = []
+        with self._lock:
+            for variable, var_value in _converted:
+                column, slot = variable.column, variable.slot
+                if var_value == column[slot]:
+                    continue
+                current = var_value
+                if variable.parser is not None:
+                    # Parsed here, once per change, instead of by every reader on every tick
+                    try:
+                        current = variable.parsed = variable.parser(var_value)
+                    except (ValueError, TypeError) as e:
+                        _invalid.append((variable.name, e))
+                        continue
+                column[slot] = var_value
+                _changed.append((variable.name, var_value, current))
+            if self._waiting and _changed:
+                self._value_changed.notify_all()
+        for var_name, e in _invalid:
+            logging.debug(f"Ignored value for {var_name}: {e}")
+            self._net_stats["invalid_values"] += 1
+        if self._observers and _changed:
+            _mirror = {var_name: var_value for var_name, var_value, _ in _changed}
+            for session in self._observers:
+                session.pending.update(_mirror)
+        recorder, on_change, subscribed = self._recorder, self._on_change, self._subscriptions
+        for var_name, var_value, current in _changed:
+            if recorder is not None:
+                recorder.inbound(var_name, var_value)
+            on_change(var_name, current)
+            if subscribed:
+                subscriptions = subscribed.get(var_name, None)
+                if subscriptions:
+                    self._dispatch(subscriptions, var_name, current)
+
+    def _dispatch(self, subscriptions:tuple, name:str, value:any):
+        for subscription in subscriptions:
             try:
-                _data, _addr = _socket.recvfrom(self._max_size) # buffer size is 4096 bytes
-                if _addr != self._client_address:
-                    self._client_address = _addr
-                    #logging.info(f"New connection established: {self._client_address}")
-                    _socket.sendto(
-                        json.dumps({"poll":int(time.perf_counter())}).encode('utf-8'), 
-                        self._client_address
-                        )
+                if subscription.fires(value):
+                    subscription.callback(name, value)
+            except Exception:
+                # A failing subscriber must not take the network thread down
+                logging.exception(f"Subscriber of {name} failed")
+
+    def _negotiate_binary(self, session:Session, version:any) -> dict:
+        """Switch the session to binary framing if allowed; returns the handshake fields to reply with."""
+        if not self._allow_binary or version != BINARY_VERSION:
+            session.codec = None
+            return {}
+        session.codec = BinaryCodec([(name, variable.datatype) for name, variable in self._variables.items()])
+        logging.info(f"Binary protocol negotiated with {session.address}")
+        return {"binary": {"version": BINARY_VERSION, "table": session.codec.table()}}
+
+    def _negotiate_reliable(self) -> dict:
+        self._reliable = self._session.reliable = True
+        logging.info(f"Acknowledged critical writes negotiated with {self._client_address}")
+        return {"reliable": 1}
+
+    def _acknowledge(self, seq:any):
+        with self._lock:
+            confirmed = [name for name, entry in self._unconfirmed.items() if entry[0] == seq]
+            for name in confirmed:
+                del self._unconfirmed[name]
+            if confirmed:
+                self._send_stats["acks"] += 1
+                self._notify_drained()
+
+    def _collect_critical(self, _send_data:dict, now:float):
+        """Track critical values in _send_data and add retransmissions of unconfirmed ones that are due."""
+        with self._lock:
+            for name in self._critical:
+                if name in _send_data:
+                    # [seq, sends, last send time]; a new value restarts the retransmit budget
+                    self._unconfirmed[name] = [None, 1, now]
+
+            if any(now - entry[2] >= self._critical[name][1] for name, entry in self._unconfirmed.items() if name not in _send_data):
+                for name, entry in list(self._unconfirmed.items()):
+                    if name in _send_data:
+                        continue
+                    retries, _ = self._critical[name]
+                    if entry[1] > retries:
+                        del self._unconfirmed[name]
+                        if self._reliable:
+                            self._send_stats["critical_failed"] += 1
+                            logging.warning(f"Critical variable {name} not acknowledged after {retries} retries")
+                        continue
+                    _send_data[name] = self._last_sent[name]
+                    entry[1] += 1
+                    entry[2] = now
+                    self._send_stats["retransmits"] += 1
+
+            if self._reliable and any(name in _send_data for name in self._unconfirmed):
+                self._seq += 1
+                _send_data["seq"] = self._seq
+                for name in self._unconfirmed:
+                    if name in _send_data:
+                        self._unconfirmed[name][0] = self._seq
+
+            if self._unconfirmed:
+                deadline = min(entry[2] + self._critical[name][1] for name, entry in self._unconfirmed.items())
+                if self._send_deadline is None or deadline < self._send_deadline:
+                    self._send_deadline = deadline
+            else:
+                self._notify_drained()
+
+    def _collect_pending(self, _send_data:dict) -> dict:
+        """
+        Move pending changes allowed by the send policies into _send_data. Sets _send_deadline to the
+        perf_counter time at which held-back changes must be reconsidered (None if nothing is held).
+        """
+        self._send_deadline = None
+        now = time.perf_counter()
+        _check = None
+        _heartbeat = self._heartbeat
+        if _heartbeat is not None and self._session is not None:
+            # Before the pending changes, so that failsafe values go out with this datagram
+            _check = self._check_link(_send_data, now, *_heartbeat)
+        if self._pending2send or self._force_flush:
+            if not self._force_flush and now < self._next_send_time:
+                self._send_deadline = self._next_send_time
+            else:
+                self._collect_allowed(_send_data, now)
+        if self._critical and self._client_address is not None:
+            self._collect_critical(_send_data, now)
+        if _check is not None and (self._send_deadline is None or _check < self._send_deadline):
+            self._send_deadline = _check
+        return _send_data
+
+    def _collect_allowed(self, _send_data:dict, now:float):
+        if len(self._pending2send) > self._net_stats["pending_max"]:
+            self._net_stats["pending_max"] = len(self._pending2send)
+        with self._lock:
+            _pending, self._pending2send = self._pending2send, {}
+            force, self._force_flush = self._force_flush, False
+
+        _held = {}
+        _sent = {}
+        _suppressed = []
+        _resumed = []
+        for var_name, var_value in _pending.items():
+            policy = self._send_policies.get(var_name, None)
+            if policy is not None and not force:
+                if policy.withinDeadband(var_value, self._last_sent.get(var_name, None)):
+                    _suppressed.append(var_name)
+                    self._send_stats["suppressed_deadband"] += 1
+                    continue
+                if now - policy.last_time < policy.min_interval:
+                    _held[var_name] = var_value
+                    self._send_stats["deferred_rate"] += 1
                     continue
-                   
-                _recv_data = json.loads(_data.decode('utf-8'))
-                logging.debug(f"Data received: {_recv_data}")
-                    
-            except:
+            if policy is not None:
+                policy.last_time = now
+                _resumed.append(var_name)
+            _sent[var_name] = var_value
+        _send_data.update(_sent)
+        self._last_sent.update(_sent)
+        for session in self._secondary:
+            session.pending.update(_sent)
+
+        if _suppressed or _resumed or _held or force:
+            # flush() reads the suppressed set from the user thread
+            with self._lock:
+                self._suppressed.difference_update(_resumed)
+                self._suppressed.update(_suppressed)
+                for var_name, var_value in _held.items():
+                    # A newer value written meanwhile wins
+                    self._pending2send.setdefault(var_name, var_value)
+                if force and (self._client_address is None or not any(name in self._critical for name in _sent)):
+                    # The flush went out; critical values sent with it are notified by _collect_critical
+                    self._notify_drained()
+        if _held:
+            self._send_deadline = min(self._send_policies[var_name].last_time + self._send_policies[var_name].min_interval for var_name in _held)
+        if _sent:
+            self._send_stats["values_sent"] += len(_sent)
+            self._send_stats["update_packets"] += 1
+            if self._send_period:
+                self._next_send_time = now + self._send_period
+
+    def _timeout(self):
+        """Seconds until held-back changes or the next heartbeat are due, for the transport's wait (None = no deadline)."""
+        if self._send_deadline is None:
+            return None
+        return max(0.0, self._send_deadline - time.perf_counter())
+
+    def _decode(self, _data:bytes, codec:BinaryCodec=None) -> dict:
+        # _data may be a memoryview into the receive ring: decode in place, without copying to bytes
+        if codec is not None and _data[:1] == _BINARY_MAGIC_BYTE:
+            return codec.decode(_data)
+        return json.loads(str(_data, 'utf-8'))
+
+    def _encode(self, _send_data:dict, _address=None) -> bytes:
+        _raw = None
+        session = self._sessions.get(_address, None)
+        codec = session.codec if session is not None else None
+        # The handshake reply carrying the table is always JSON
+        if codec is not None and "binary" not in _send_data:
+            try:
+                _raw = codec.encode(_send_data)
+            except (KeyError, struct.error):
+                # Variable added after negotiation or value out of range for its type
+                pass
+        if _raw is None:
+            _raw = json.dumps(_send_data).encode('utf-8')
+        self._net_stats["packets_out"] += 1
+        self._net_stats["bytes_out"] += len(_raw)
+        return _raw
+
+
+class UDP_Controller(ControllerBase, threading.Thread):
+
+    def __init__(self, ip:str="0.0.0.0", port:int=8400, max_size:int=1024, log_lever=logging.INFO, allow_binary:bool=True):
+        ControllerBase.__init__(self, ip, port, max_size, log_lever, allow_binary)
+        # Self-pipe used to wake the network thread when there is something to send or on close
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._wakeup_pending = False
+        threading.Thread.__init__(self, name="Simumatik Controller", daemon=True)
+
+    def close(self, drain:bool=False, timeout:float=1.0):
+        """Stop the controller. With drain=True, first wait up to timeout for pending and critical writes to go out."""
+        if drain and self.is_alive():
+            if not self.flush(timeout):
+                logging.warning("Controller closed before all critical writes were confirmed")
+        if self._exporter is not None:
+            self._exporter.close()
+        self._running = False
+        self._wakeup()
+
+    def _notify_pending(self):
+        self._wakeup()
+
+    def _wakeup(self):
+        if not self._wakeup_pending:
+            self._wakeup_pending = True
+            try:
+                self._wakeup_send.send(b'\0')
+            except OSError:
                 pass
-                
-            if self._client_address is not None:
 
-                if _recv_data:
-                    if _recv_data.get("poll", None):
-                        _recv_data.pop("poll")
-                        _send_data.update({"poll":int(time.perf_counter())})
-                        
-                    for var_name, var_value in _recv_data.items():
-                        self.setValue(var_name, var_value, send_update=False)
+    def run(self):
+        _socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        _socket.bind((self._ip, self._port))
+        _socket.setblocking(False)
+        _selector = selectors.DefaultSelector()
+        _selector.register(_socket, selectors.EVENT_READ)
+        _selector.register(self._wakeup_recv, selectors.EVENT_READ)
+        _ring = ReceiveRing(self._max_size)
+        logging.info(f"Controller UDP server listening: {self._ip}: {self._port}")
 
-                while self._pending2send:
-                    (var_name, var_value) = self._pending2send.popitem()
-                    _send_data.update({var_name:var_value})
+        while self._running:
+
+            # Block until a datagram arrives or setValue/close wakes us up
+            _events = _selector.select(self._timeout())
+            _start = time.perf_counter()
+            for _key, _ in _events:
+                if _key.fileobj is self._wakeup_recv:
+                    try:
+                        while self._wakeup_recv.recv(64):
+                            pass
+                    except OSError:
+                        pass
+                    # Only once the socketpair is empty: a wake-up sent while draining is not lost
+                    self._wakeup_pending = False
+
+            # Drain every datagram available in the socket buffer, a ring-sized batch at a time
+            while self._running:
+                _count = _ring.fill(_socket, self._net_stats)
+                for _index in range(_count):
+                    _addr = _ring.addresses[_index]
+                    self._send(_socket, self._receive(_ring.datagram(_index), _addr), _addr)
+                if _count < RX_RING_SLOTS:
+                    break
 
-                if _send_data:
-                    _socket.sendto(json.dumps(_send_data).encode('utf-8'), self._client_address)
-                    logging.debug(f"Data sent: {_send_data}")
+            for _addr, _send_data in self._outbound():
+                self._send(_socket, _send_data, _addr)
 
-            time.sleep(1e-6)
+            self._record_iteration(time.perf_counter() - _start)
 
+        _selector.close()
         _socket.close()
-        _socket = None
\ No newline at end of file
+        _socket = None
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+
+    def _send(self, _socket, _send_data:dict, _addr):
+        if _send_data:
+            try:
+                _socket.sendto(self._encode(_send_data, _addr), _addr)
+                logging.debug(f"Data sent to {_addr}: {_send_data}")
+            except OSError as e:
+                logging.warning(f"Send to {_addr} failed: {e}")
+                self._net_stats["send_errors"] += 1
@@ -0,0 +1,194 @@
+import threading
+import socket
+import selectors
+import heapq
+import time
+import logging
+from Controller import ControllerBase, DataType, ReceiveRing, RX_RING_SLOTS
+
+
+class RobotChannel(ControllerBase):
+    """Variable table and UDP socket of one robot served by a ControllerHub."""
+
+    def __init__(self, hub, ip:str, port:int, max_size:int, allow_binary:bool=True):
+        ControllerBase.__init__(self, ip, port, max_size, logging.getLogger().level, allow_binary)
+        self._hub = hub
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((ip, port))
+        self._socket.setblocking(False)
+
+    @property
+    def port(self):
+        return self._port
+
+    def _notify_pending(self):
+        self._hub._mark_dirty(self)
+
+    def _send(self, _send_data:dict, _addr):
+        if _send_data:
+            try:
+                self._socket.sendto(self._encode(_send_data, _addr), _addr)
+                logging.debug(f"Data sent from {self._port} to {_addr}: {_send_data}")
+            except OSError as e:
+                logging.warning(f"Send to {_addr} failed: {e}")
+                self._net_stats["send_errors"] += 1
+
+
+class ControllerHub(threading.Thread):
+    """
+    Serves many robots from a single thread: one UDP port per robot, all sockets in one selector,
+    and one scheduler running the control callbacks of every robot.
+
+        hub = ControllerHub()
+        for port in range(8400, 8450):
+            robot = hub.addRobot(port)
+            robot.addVariable("sensor", DataType.STRING, "")
+            hub.schedule(0.02, control_law, robot)
+        hub.start()
+
+    Callbacks run in the hub thread, so they can use the robot variables without locking.
+    """
+
+    def __init__(self, ip:str="0.0.0.0", max_size:int=1024, log_lever=logging.INFO, allow_binary:bool=True):
+        logging.basicConfig(level=log_lever, format='%(asctime)-15s %(levelname)s %(name)s: %(message)s')
+        self._ip = ip
+        self._max_size = max_size
+        self._allow_binary = allow_binary
+        self._running = True
+        self._robots = {}
+        self._timers = []
+        self._timer_count = 0
+        self._dirty = set()
+        self._deferred = set()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._wakeup_pending = False
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ, None)
+        threading.Thread.__init__(self, name="Simumatik Controller Hub", daemon=True)
+
+    def addRobot(self, port:int, ip:str=None) -> RobotChannel:
+        assert not self.is_alive(), "Robots must be added before the hub is started!"
+        assert port not in self._robots, f"Port {port} already in use!"
+        robot = RobotChannel(self, ip or self._ip, port, self._max_size, self._allow_binary)
+        self._robots[port] = robot
+        self._selector.register(robot._socket, selectors.EVENT_READ, robot)
+        return robot
+
+    def getRobot(self, port:int) -> RobotChannel:
+        assert port in self._robots, f"No robot on port {port}!"
+        return self._robots[port]
+
+    @property
+    def robots(self):
+        return list(self._robots.values())
+
+    def schedule(self, period:float, callback, *args):
+        """Run callback(*args) every period seconds in the hub thread."""
+        assert not self.is_alive(), "Callbacks must be scheduled before the hub is started!"
+        self._timer_count += 1
+        heapq.heappush(self._timers, (time.perf_counter() + period, self._timer_count, period, callback, args))
+
+    def close(self, drain:bool=False, timeout:float=1.0):
+        """Stop the hub. With drain=True, first wait up to timeout for every robot's critical writes to go out."""
+        if drain and self.is_alive():
+            deadline = time.perf_counter() + timeout
+            for robot in self._robots.values():
+                if not robot.flush(max(0.001, deadline - time.perf_counter())):
+                    logging.warning(f"Critical writes of robot {robot.port} not confirmed before close")
+        self._running = False
+        self._wakeup()
+
+    def _mark_dirty(self, robot:RobotChannel):
+        self._dirty.add(robot)
+        if threading.get_ident() != self.ident:
+            self._wakeup()
+
+    def _wakeup(self):
+        if not self._wakeup_pending:
+            self._wakeup_pending = True
+            try:
+                self._wakeup_send.send(b'\0')
+            except OSError:
+                pass
+
+    def _flush_robot(self, robot:RobotChannel):
+        for _addr, _send_data in robot._outbound():
+            robot._send(_send_data, _addr)
+        self._track_deadline(robot)
+
+    def _track_deadline(self, robot:RobotChannel):
+        # Robots with changes held back by their send policies need a timed wake-up
+        if robot._send_deadline is None:
+            self._deferred.discard(robot)
+        else:
+            self._deferred.add(robot)
+
+    def _run_timers(self):
+        now = time.perf_counter()
+        while self._timers and self._timers[0][0] <= now:
+            deadline, count, period, callback, args = heapq.heappop(self._timers)
+            try:
+                callback(*args)
+            except Exception:
+                logging.exception(f"Scheduled callback {callback} failed")
+            deadline += period
+            if deadline < now:
+                # Overrun: skip missed periods instead of bursting to catch up
+                deadline = now + period
+            heapq.heappush(self._timers, (deadline, count, period, callback, args))
+
+    def run(self):
+        # One receive ring for all robots: datagrams are handled before the next socket is read
+        _ring = ReceiveRing(self._max_size)
+        logging.info(f"Controller hub serving {len(self._robots)} robots on {self._ip}")
+
+        while self._running:
+
+            timeout = None
+            if self._timers:
+                timeout = max(0.0, self._timers[0][0] - time.perf_counter())
+            for robot in self._deferred:
+                robot_timeout = robot._timeout()
+                if robot_timeout is not None and (timeout is None or robot_timeout < timeout):
+                    timeout = robot_timeout
+
+            for _key, _ in self._selector.select(timeout):
+                robot = _key.data
+                if robot is None:
+                    try:
+                        while self._wakeup_recv.recv(64):
+                            pass
+                    except OSError:
+                        pass
+                    # Only once the socketpair is empty: a wake-up sent while draining is not lost
+                    self._wakeup_pending = False
+                    continue
+                while True:
+                    _count = _ring.fill(robot._socket, robot._net_stats)
+                    for _index in range(_count):
+                        _addr = _ring.addresses[_index]
+                        robot._send(robot._receive(_ring.datagram(_index), _addr), _addr)
+                    self._track_deadline(robot)
+                    if _count < RX_RING_SLOTS:
+                        break
+                if robot._observers:
+                    # Inbound changes mirrored to observers
+                    self._dirty.add(robot)
+
+            self._run_timers()
+
+            while self._dirty:
+                self._flush_robot(self._dirty.pop())
+
+            now = time.perf_counter()
+            for robot in [robot for robot in self._deferred if robot._send_deadline is not None and robot._send_deadline <= now]:
+                self._flush_robot(robot)
+
+        for robot in self._robots.values():
+            self._selector.unregister(robot._socket)
+            robot._socket.close()
+        self._selector.close()
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
@@ -0,0 +1,264 @@
+# FakeSimumatik.py
+# Stand-in for the Simumatik gateway, for load and latency testing of the controllers without the real sim.
+# Each FakeGateway is the UDP client of one controller port and simulates a differential-drive robot
+# driven by left_speed/right_speed, following a line along the x axis. It reports "sensor" (8 rays,
+# leftmost first, "1" = line seen) and "stopinput" ("[24,0,0]" inside a stop zone, else "[0,0,0]").
+# A FakeGatewayPool runs any number of gateways from one thread. With pong=True a gateway answers
+# the controller's heartbeat polls with "pong" (see UDP_Controller.setHeartbeat); paused=True
+# makes it go silent, as the sim does when paused.
+#
+#   python FakeSimumatik.py --ports 8400 8500 --rate 100 --loss 0.05 --jitter 0.002
+
+import threading
+import socket
+import selectors
+import argparse
+import random
+import json
+import math
+import time
+import logging
+from Controller import BinaryCodec, BINARY_MAGIC, BINARY_VERSION
+
+
+class SimulatedRobot:
+    """Kinematics of a differential-drive robot and its line/stop sensors."""
+
+    def __init__(self, wheel_gain:float=0.05, track:float=0.1, y:float=0.0, theta:float=0.0,
+                 ray_offsets:tuple=(-0.035, -0.025, -0.015, -0.005, 0.005, 0.015, 0.025, 0.035),
+                 lookahead:float=0.05, line_width:float=0.02, stop_zones:tuple=((1.0, 1.2),)):
+        self.wheel_gain = wheel_gain      # m/s per unit of wheel speed
+        self.track = track                # distance between wheels (m)
+        self.ray_offsets = ray_offsets    # lateral ray positions, left to right (m)
+        self.lookahead = lookahead
+        self.line_width = line_width
+        self.stop_zones = stop_zones
+        self.x, self.y, self.theta = 0.0, y, theta
+        self.left_speed = self.right_speed = 0.0
+
+    def step(self, dt:float):
+        left = self.left_speed * self.wheel_gain
+        right = self.right_speed * self.wheel_gain
+        v = (left + right) / 2.0
+        w = (right - left) / self.track
+        self.x += v * math.cos(self.theta) * dt
+        self.y += v * math.sin(self.theta) * dt
+        self.theta += w * dt
+
+    def sensor(self) -> str:
+        cos_t, sin_t = math.cos(self.theta), math.sin(self.theta)
+        fx = self.x + self.lookahead * cos_t
+        fy = self.y + self.lookahead * sin_t
+        bits = []
+        for offset in self.ray_offsets:
+            # Left of the heading is +90 degrees; leftmost ray has the most negative offset
+            ry = fy - offset * cos_t
+            bits.append("1" if abs(ry) <= self.line_width / 2 else "0")
+        return "".join(bits)
+
+    def stopinput(self) -> str:
+        for x0, x1 in self.stop_zones:
+            if x0 <= self.x <= x1:
+                return "[24,0,0]"
+        return "[0,0,0]"
+
+
+class FakeGateway:
+    """One simulated Simumatik gateway talking to the controller on (ip, port)."""
+
+    def __init__(self, port:int, ip:str="127.0.0.1", rate:float=100.0, loss:float=0.0, jitter:float=0.0,
+                 binary:bool=False, reliable:bool=False, pong:bool=False, robot:SimulatedRobot=None, seed:int=None):
+        self.address = (ip, port)
+        self.period = 1.0 / rate
+        self.loss = loss
+        self.jitter = jitter
+        self.binary = binary
+        self.reliable = reliable
+        self.pong = pong
+        self.paused = False
+        self.robot = robot or SimulatedRobot()
+        self.random = random.Random(seed)
+        self.codec = None
+        self.connected = False
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.next_time = 0.0
+        self.last_step = None
+        self.poll = 0
+        self.last_pong = None
+        self.last_inputs = {}
+        self.stats = {"sent": 0, "received": 0, "dropped_out": 0, "dropped_in": 0, "acks": 0, "malformed": 0}
+
+    def _sendto(self, data:dict):
+        if self.loss and self.random.random() < self.loss:
+            self.stats["dropped_out"] += 1
+            return
+        if self.codec is not None and "ack" not in data and "pong" not in data:
+            raw = self.codec.encode(data)
+        else:
+            raw = json.dumps(data).encode('utf-8')
+        try:
+            self.socket.sendto(raw, self.address)
+            self.stats["sent"] += 1
+        except OSError as e:
+            logging.debug(f"Fake gateway send to {self.address} failed: {e}")
+
+    def handshake(self):
+        data = {"poll": 1}
+        if self.binary:
+            data["binary"] = BINARY_VERSION
+        if self.reliable:
+            data["reliable"] = 1
+        # Handshake is not subject to loss, the real gateway retries it anyway
+        self.socket.sendto(json.dumps(data).encode('utf-8'), self.address)
+
+    def tick(self, now:float):
+        """Advance the robot to now and send inputs (nothing while paused). Returns the time of the next tick."""
+        if self.last_step is not None and not self.paused:
+            self.robot.step(now - self.last_step)
+        self.last_step = now
+        if not self.connected and not self.paused:
+            self.handshake()
+        elif not self.paused:
+            self.poll += 1
+            data = {"poll": self.poll}
+            inputs = {"sensor": self.robot.sensor(), "stopinput": self.robot.stopinput()}
+            # Like the real gateway, only changed inputs are sent (all of them right after connecting)
+            for name, value in inputs.items():
+                if self.last_inputs.get(name, None) != value:
+                    data[name] = value
+            self.last_inputs = inputs
+            self._sendto(data)
+        self.next_time += self.period
+        if self.next_time < now:
+            self.next_time = now + self.period
+        return self.next_time + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def receive(self, raw:bytes):
+        if self.paused:
+            return
+        if self.loss and self.random.random() < self.loss:
+            self.stats["dropped_in"] += 1
+            return
+        self.stats["received"] += 1
+        try:
+            if self.codec is not None and raw[:1] == bytes((BINARY_MAGIC,)):
+                data = self.codec.decode(raw)
+            else:
+                data = json.loads(raw.decode('utf-8'))
+        except ValueError:
+            self.stats["malformed"] += 1
+            return
+        if not self.connected:
+            self.connected = True
+            self.last_inputs = {}
+        if "binary" in data:
+            self.codec = BinaryCodec(data.pop("binary")["table"])
+        seq = data.pop("seq", None)
+        if seq is not None:
+            self._sendto({"ack": seq})
+            self.stats["acks"] += 1
+        poll = data.pop("poll", None)
+        # The replies to our own polls carry the same value for a whole second: answered once
+        if self.pong and poll is not None and poll != self.last_pong:
+            self.last_pong = poll
+            self._sendto({"pong": poll})
+        if "left_speed" in data:
+            self.robot.left_speed = float(data["left_speed"])
+        if "right_speed" in data:
+            self.robot.right_speed = float(data["right_speed"])
+
+    def close(self):
+        self.socket.close()
+
+
+class FakeGatewayPool(threading.Thread):
+    """Runs many FakeGateways from one thread with one selector."""
+
+    def __init__(self):
+        threading.Thread.__init__(self, name="Fake Simumatik", daemon=True)
+        self._gateways = []
+        self._selector = selectors.DefaultSelector()
+        self._running = True
+
+    def add(self, port:int, **config) -> FakeGateway:
+        assert not self.is_alive(), "Gateways must be added before the pool is started!"
+        gateway = FakeGateway(port, **config)
+        self._gateways.append(gateway)
+        self._selector.register(gateway.socket, selectors.EVENT_READ, gateway)
+        return gateway
+
+    @property
+    def gateways(self):
+        return list(self._gateways)
+
+    def stats(self) -> dict:
+        total = {}
+        for gateway in self._gateways:
+            for key, value in gateway.stats.items():
+                total[key] = total.get(key, 0) + value
+        return total
+
+    def close(self):
+        self._running = False
+
+    def run(self):
+        now = time.perf_counter()
+        # Spread the first ticks over one period so hundreds of gateways do not fire together
+        due = [now + i * gateway.period / max(1, len(self._gateways)) for i, gateway in enumerate(self._gateways)]
+        for gateway, when in zip(self._gateways, due):
+            gateway.next_time = when
+
+        while self._running:
+            timeout = max(0.0, min(due) - time.perf_counter()) if due else 0.1
+            for key, _ in self._selector.select(min(timeout, 0.1)):
+                gateway = key.data
+                while True:
+                    try:
+                        raw, _ = gateway.socket.recvfrom(65536)
+                    except BlockingIOError:
+                        break
+                    except OSError:
+                        # ICMP port unreachable while the controller is not up yet
+                        break
+                    gateway.receive(raw)
+            now = time.perf_counter()
+            for i, gateway in enumerate(self._gateways):
+                if due[i] <= now:
+                    due[i] = gateway.tick(now)
+
+        for gateway in self._gateways:
+            self._selector.unregister(gateway.socket)
+            gateway.close()
+        self._selector.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Simumatik gateway for controller testing")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--ports", type=int, nargs="+", default=[8400])
+    parser.add_argument("--rate", type=float, default=100.0, help="input packets per second per robot")
+    parser.add_argument("--loss", type=float, default=0.0, help="drop probability per datagram")
+    parser.add_argument("--jitter", type=float, default=0.0, help="max random send delay (s)")
+    parser.add_argument("--binary", action="store_true")
+    parser.add_argument("--reliable", action="store_true")
+    parser.add_argument("--pong", action="store_true", help="answer the controller's heartbeat polls")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)-15s %(levelname)s %(name)s: %(message)s')
+    pool = FakeGatewayPool()
+    for port in args.ports:
+        pool.add(port, ip=args.ip, rate=args.rate, loss=args.loss, jitter=args.jitter, binary=args.binary, reliable=args.reliable, pong=args.pong)
+    pool.start()
+    try:
+        while True:
+            time.sleep(1.0)
+            for gateway in pool.gateways:
+                robot = gateway.robot
+                logging.info(f"{gateway.address[1]}: x={robot.x:+.3f} y={robot.y:+.3f} th={robot.theta:+.2f} "
+                             f"L={robot.left_speed:+.2f} R={robot.right_speed:+.2f} sensor={robot.sensor()} {gateway.stats}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
+        pool.join(1.0)
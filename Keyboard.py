@@ -0,0 +1,246 @@
+# Keyboard.py
+# Keyboard input for the teleop scripts, on Windows and Linux. A backend thread blocks on the
+# keyboard and pushes key names into a queue. The control loop drains the queue once per tick, with
+# no syscall per tick.
+#
+#   keyboard = openKeyboard()           # msvcrt on Windows, termios on a Linux/Mac terminal
+#   keyboard.start()
+#   for tick in RateLoop(0.01):
+#       for command in keyboard.commands():
+#           left, right = drive(command, left, right, STEP, MAX_SPEED)
+#   keyboard.close()
+#
+# Key names: "w", "a", ... (lowercase letters), "up", "down", "left", "right", "space", "esc".
+
+import sys
+import os
+import threading
+import selectors
+import time
+from collections import deque
+
+# Key -> command. Shared by every teleop script instead of per-script if/elif chains.
+KEY_COMMANDS = {
+    "w": "forward",  "up": "forward",
+    "s": "backward", "down": "backward",
+    "a": "left",     "left": "left",
+    "d": "right",    "right": "right",
+    "space": "stop",
+    "q": "quit",
+    }
+
+# Command -> (left, right) wheel speed change, in steps
+DRIVE_STEPS = {
+    "forward": (+1, +1),
+    "backward": (-1, -1),
+    "left": (-1, +1),
+    "right": (+1, -1),
+    }
+
+
+def drive(command:str, left:float, right:float, step:float, max_speed:float) -> tuple:
+    """New (left, right) wheel speeds after a drive command; "stop" zeroes both, others leave them."""
+    if command == "stop":
+        return 0.0, 0.0
+    delta = DRIVE_STEPS.get(command, None)
+    if delta is None:
+        return left, right
+    left = max(-max_speed, min(max_speed, left + delta[0] * step))
+    right = max(-max_speed, min(max_speed, right + delta[1] * step))
+    return left, right
+
+
+class KeyboardBackend(threading.Thread):
+    """Base of the keyboard backends: a daemon thread filling a queue of key names."""
+
+    def __init__(self, name:str="Keyboard"):
+        threading.Thread.__init__(self, name=name, daemon=True)
+        self._events = deque(maxlen=256)
+        self._running = True
+
+    def push(self, key:str):
+        # deque.append is atomic: no lock needed between the backend thread and the control loop
+        self._events.append(key)
+
+    def keys(self) -> list:
+        """Every key pressed since the last call, oldest first."""
+        keys = []
+        while self._events:
+            keys.append(self._events.popleft())
+        return keys
+
+    def commands(self, table:dict=KEY_COMMANDS) -> list:
+        """keys() translated through table; unmapped keys are dropped."""
+        return [table[key] for key in self.keys() if key in table]
+
+    def close(self):
+        self._running = False
+
+
+# msvcrt.getch() codes after the b'\xe0' / b'\x00' prefix
+_MSVCRT_ARROWS = {b'H': "up", b'P': "down", b'K': "left", b'M': "right"}
+# ANSI escape sequences sent by terminals for the arrow keys
+_ANSI_ARROWS = {"A": "up", "B": "down", "D": "left", "C": "right"}
+
+
+def _key_name(char:str) -> str:
+    if char == " ":
+        return "space"
+    if char == "\x1b":
+        return "esc"
+    return char.lower()
+
+
+class MsvcrtKeyboard(KeyboardBackend):
+    """Windows console keyboard. The thread blocks in msvcrt.getch()."""
+
+    def __init__(self):
+        import msvcrt
+        KeyboardBackend.__init__(self, "Keyboard (msvcrt)")
+        self._msvcrt = msvcrt
+
+    def run(self):
+        while self._running:
+            ch = self._msvcrt.getch()
+            if ch in (b'\xe0', b'\x00'):
+                key = _MSVCRT_ARROWS.get(self._msvcrt.getch(), None)
+                if key is not None:
+                    self.push(key)
+            else:
+                self.push(_key_name(ch.decode('latin-1')))
+
+
+class TermiosKeyboard(KeyboardBackend):
+    """
+    Linux/Mac terminal keyboard: stdin in cbreak mode (no line buffering, no echo), restored on close.
+    The thread blocks in a selector on stdin.
+    """
+
+    def __init__(self, fd:int=None):
+        import termios
+        KeyboardBackend.__init__(self, "Keyboard (termios)")
+        self._termios = termios
+        self._fd = sys.stdin.fileno() if fd is None else fd
+        self._saved = None
+
+    def start(self):
+        import tty
+        self._saved = self._termios.tcgetattr(self._fd)
+        tty.setcbreak(self._fd)
+        KeyboardBackend.start(self)
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._fd, selectors.EVENT_READ)
+        pending = ""
+        try:
+            while self._running:
+                # Timeout only to notice close(); a lone ESC is flushed when no sequence follows
+                if not selector.select(0.1):
+                    if pending:
+                        self.push("esc")
+                        pending = ""
+                    continue
+                pending += os.read(self._fd, 64).decode('utf-8', 'replace')
+                pending = self._parse(pending)
+        finally:
+            selector.close()
+
+    def _parse(self, text:str) -> str:
+        """Push the keys in text and return an incomplete escape sequence left at its end."""
+        i = 0
+        while i < len(text):
+            if text[i] == "\x1b":
+                if i + 1 >= len(text) or (text[i+1] in "[O" and i + 2 >= len(text)):
+                    return text[i:]
+                if text[i+1] in "[O":
+                    key = _ANSI_ARROWS.get(text[i+2], None)
+                    if key is not None:
+                        self.push(key)
+                    i += 3
+                    continue
+                self.push("esc")
+                i += 1
+                continue
+            self.push(_key_name(text[i]))
+            i += 1
+        return ""
+
+    def close(self):
+        KeyboardBackend.close(self)
+        if self._saved is not None:
+            self._termios.tcsetattr(self._fd, self._termios.TCSADRAIN, self._saved)
+            self._saved = None
+
+
+class EvdevKeyboard(KeyboardBackend):
+    """
+    Linux input device (/dev/input/event*) through the optional evdev package: works without a
+    terminal, e.g. over a headless session, but needs read access to the device.
+    """
+
+    _CODES = {"KEY_UP": "up", "KEY_DOWN": "down", "KEY_LEFT": "left", "KEY_RIGHT": "right",
+              "KEY_SPACE": "space", "KEY_ESC": "esc"}
+
+    def __init__(self, device:str):
+        import evdev
+        KeyboardBackend.__init__(self, "Keyboard (evdev)")
+        self._evdev = evdev
+        self._device = evdev.InputDevice(device)
+
+    def run(self):
+        ecodes = self._evdev.ecodes
+        selector = selectors.DefaultSelector()
+        selector.register(self._device.fd, selectors.EVENT_READ)
+        try:
+            while self._running:
+                if not selector.select(0.1):
+                    continue
+                for event in self._device.read():
+                    # Key down and auto-repeat, like a terminal
+                    if event.type != ecodes.EV_KEY or event.value not in (1, 2):
+                        continue
+                    name = ecodes.KEY.get(event.code, None)
+                    if isinstance(name, list):
+                        name = name[0]
+                    if name is None:
+                        continue
+                    key = self._CODES.get(name, None)
+                    if key is None and len(name) == 5:
+                        key = name[4].lower()    # KEY_W -> "w"
+                    if key is not None:
+                        self.push(key)
+        finally:
+            selector.close()
+            self._device.close()
+
+
+class ScriptedKeyboard(KeyboardBackend):
+    """Replays [(seconds after start, key), ...], for tests and demos without a keyboard."""
+
+    def __init__(self, script:list):
+        KeyboardBackend.__init__(self, "Keyboard (scripted)")
+        self._script = sorted(script)
+
+    def run(self):
+        start = time.perf_counter()
+        for at, key in self._script:
+            delay = start + at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if not self._running:
+                break
+            self.push(key)
+
+    def done(self) -> bool:
+        return not self.is_alive() and not self._events
+
+
+def openKeyboard(device:str=None) -> KeyboardBackend:
+    """The keyboard backend for this platform: msvcrt on Windows, evdev if device is given, else termios."""
+    if os.name == "nt":
+        return MsvcrtKeyboard()
+    if device is not None:
+        return EvdevKeyboard(device)
+    assert sys.stdin.isatty(), "No terminal on stdin: pass an evdev device or use ScriptedKeyboard!"
+    return TermiosKeyboard()
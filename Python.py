@@ -1,6 +1,14 @@
 import time
 from Controller import UDP_Controller
 
+object_count = 0
+
+def count_object(name, value):
+    # Rising edge of the photo-electric sensor (IN8, lowest bit of digital_inputs2)
+    global object_count
+    object_count = object_count + 1
+    print(object_count)
+
 if __name__ == '__main__':
 
     _controller = UDP_Controller()
@@ -9,17 +17,14 @@ if __name__ == '__main__':
     _controller.addVariable("digital_outputs1", "byte", 0)
     _controller.addVariable("digital_outputs2", "byte", 0)
     _controller.addVariable("linear_drive", "int", 0)
+    _controller.subscribe("digital_inputs2", count_object, edge="rising", predicate=lambda value: value & 1)
     _controller.start()
-
-    #Initialize variables
-    object_count = 0
-    temp_bool1 = False
-    Count_Flag1 = False
         
     while True:
         #Reading inputs
-        [IN7,IN6,IN5,IN4,IN3,Drive_Rev,Drive_Fwd,Toggle_Sw] = _controller.getMappedValue("digital_inputs1")     
-        [IN15,IN14,IN13,IN12,IN11,IN10,IN9,IN8] = _controller.getMappedValue("digital_inputs2")     
+        inputs1, inputs2 = _controller.getMappedValues(["digital_inputs1", "digital_inputs2"])
+        [IN7,IN6,IN5,IN4,IN3,Drive_Rev,Drive_Fwd,Toggle_Sw] = inputs1
+        [IN15,IN14,IN13,IN12,IN11,IN10,IN9,IN8] = inputs2
         linear_drive = _controller.getValue("linear_drive") 
         
         #Start Conveyor
@@ -33,15 +38,6 @@ if __name__ == '__main__':
         if Move_Fwd or Move_Rev:
             print('Linear drive feedback:' + str(linear_drive))
         
-        #Flag photo-electric sensor
-        Count_Flag1 = IN8 and not temp_bool1
-        temp_bool1 = IN8
-        
-        #Count non metal objects
-        if Count_Flag1:
-            object_count = object_count + 1
-            print(object_count)
-                 
         #Writing outputs
         _controller.setMappedValue("digital_outputs1", [False, Move_Fwd, Move_Rev, Red_Indicator, False, Green_Indicator, False, Motor])
         time.sleep(1e-5)
\ No newline at end of file
@@ -1,6 +1,15 @@
 # mini_robot_udp.py
-from Controller import UDP_Controller
-import time
+# Line follower. "python RUNROBOT.py" drives the robot on port 8500; "python RUNROBOT.py N" drives a
+# swarm of N robots on ports 8500.. from one ControllerHub with the batched control law.
+import sys
+from Controller import UDP_Controller, parseBits
+from ControllerHub import ControllerHub
+from RateLoop import RateLoop
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def parse_sensor(s):
     s = (s or "")[:8].ljust(8, "0")     # "01000000"
@@ -9,23 +18,81 @@ def parse_sensor(s):
 BASE_SPEED = 0.6
 STEER_GAIN = 0.4
 WEIGHTS = [-3,-2,-1,-0.5, 0.5,1,2,3]    # left→right rays
+PORT = 8500
 
-if __name__ == "__main__":
-    ctrl = UDP_Controller(ip="127.0.0.1", port=8500)  # must match the component
-    ctrl.addVariable("sensor", "str", "")
+def control(sensor):
+    """sensor: the raw string, or its rays already parsed (getValue of the structured variable)."""
+    bits = sensor if isinstance(sensor, tuple) else parse_sensor(sensor)
+    steer = sum(w*b for w,b in zip(WEIGHTS, bits))
+    left  = max(-1.0, min(1.0, BASE_SPEED - STEER_GAIN*steer))
+    right = max(-1.0, min(1.0, BASE_SPEED + STEER_GAIN*steer))
+    return left, right
+
+# Without numpy the batch goes through a table of the (few) distinct sensor strings seen
+_CONTROL_CACHE = {}
+
+def control_batch(sensors):
+    """Left and right speeds for N sensor strings: two lists (numpy arrays if numpy is installed)."""
+    if np is None:
+        outputs = []
+        for sensor in sensors:
+            output = _CONTROL_CACHE.get(sensor)
+            if output is None:
+                output = control(sensor)
+                if len(_CONTROL_CACHE) < 4096:
+                    _CONTROL_CACHE[sensor] = output
+            outputs.append(output)
+        return [left for left, _ in outputs], [right for _, right in outputs]
+    # (N, 8) uint8 matrix of rays in one pass over the joined strings (non-ASCII becomes "?", i.e. 0)
+    raw = "".join([(s or "")[:8].ljust(8, "0") for s in sensors]).encode("ascii", "replace")
+    bits = (np.frombuffer(raw, dtype=np.uint8).reshape(-1, 8) == ord("1")).astype(np.uint8)
+    steer = bits @ np.asarray(WEIGHTS)
+    left = np.clip(BASE_SPEED - STEER_GAIN*steer, -1.0, 1.0)
+    right = np.clip(BASE_SPEED + STEER_GAIN*steer, -1.0, 1.0)
+    return left, right
+
+def control_swarm(robots):
+    """Hub callback: one control step for every robot at once."""
+    # Raw strings: the batch parses all the rays in one pass
+    left, right = control_batch([robot.getRawValue("sensor") for robot in robots])
+    for robot, l, r in zip(robots, left, right):
+        robot.setValues({"left_speed": float(l), "right_speed": float(r)})
+
+def add_variables(ctrl):
+    ctrl.addVariable("sensor", "str", "", parser=parseBits(8))    # getValue -> (0,1,0,0,0,0,0,0)
     ctrl.addVariable("left_speed", "float", 0.0)
     ctrl.addVariable("right_speed", "float", 0.0)
+    ctrl.setCritical("left_speed")
+    ctrl.setCritical("right_speed")
+
+def run_swarm(count):
+    hub = ControllerHub(ip="127.0.0.1")
+    for port in range(PORT, PORT + count):
+        add_variables(hub.addRobot(port))
+    hub.schedule(0.02, control_swarm, hub.robots)
+    hub.start()
+    try:
+        hub.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for robot in hub.robots:
+            robot.setValues({"left_speed": 0.0, "right_speed": 0.0})
+        hub.close(drain=True)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run_swarm(int(sys.argv[1]))
+        sys.exit()
+
+    ctrl = UDP_Controller(ip="127.0.0.1", port=PORT)  # must match the component
+    add_variables(ctrl)
     ctrl.start()  # opens the UDP link via Gateway  :contentReference[oaicite:6]{index=6}
 
     try:
-        while True:
-            bits = parse_sensor(ctrl.getValue("sensor"))
-            steer = sum(w*b for w,b in zip(WEIGHTS, bits))
-            left  = max(-1.0, min(1.0, BASE_SPEED - STEER_GAIN*steer))
-            right = max(-1.0, min(1.0, BASE_SPEED + STEER_GAIN*steer))
-            ctrl.setValue("left_speed", left)
-            ctrl.setValue("right_speed", right)
-            time.sleep(0.02)
+        for tick in RateLoop(0.02, name="line follower"):
+            left, right = control(ctrl.getValue("sensor"))
+            ctrl.setValues({"left_speed": left, "right_speed": right})
     finally:
-        ctrl.setValue("left_speed", 0.0)
-        ctrl.setValue("right_speed", 0.0)
+        ctrl.setValues({"left_speed": 0.0, "right_speed": 0.0})
+        ctrl.close(drain=True)
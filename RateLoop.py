@@ -0,0 +1,110 @@
+import time
+import logging
+
+# What to do with deadlines missed because a tick overran
+SKIP = "skip"            # drop the missed ticks and realign the schedule to now
+CATCH_UP = "catch_up"    # run the missed ticks back-to-back (bounded by max_catch_up) to keep the tick count
+
+
+class Tick:
+    """One iteration of a RateLoop."""
+    __slots__ = ("index", "time", "dt", "lateness", "overrun")
+
+    def __init__(self, index:int, time:float, dt:float, lateness:float, overrun:bool):
+        self.index = index          # tick number, starting at 0
+        self.time = time            # perf_counter() when the tick started
+        self.dt = dt                # measured seconds since the previous tick (the period on the first one)
+        self.lateness = lateness    # seconds the tick started after its deadline
+        self.overrun = overrun      # True if the previous tick's work ran past this tick's deadline
+
+
+class RateLoop:
+    """
+    Fixed-rate loop on absolute perf_counter deadlines, replacing "work; time.sleep(dt)" loops whose real
+    period is dt plus work time plus OS jitter.
+
+        loop = RateLoop(0.02)
+        for tick in loop:
+            seq_timer += tick.dt    # real elapsed time, not the nominal period
+            ...
+        print(loop.stats())
+
+    The period can be changed between ticks (loop.period = 0.01); it applies from the next deadline on.
+    """
+
+    def __init__(self, period:float, policy:str=SKIP, max_catch_up:int=5, name:str="loop"):
+        assert period > 0, "Period must be positive!"
+        assert policy in (SKIP, CATCH_UP), f"Unknown overrun policy {policy}!"
+        self.period = period
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.name = name
+        self._running = True
+        self._ticks = 0
+        self._overruns = 0
+        self._skipped = 0
+        self._max_lateness = 0.0
+        self._dt_sum = 0.0
+        self._dt_min = float("inf")
+        self._dt_max = 0.0
+
+    def stop(self):
+        self._running = False
+
+    def __iter__(self):
+        now = time.perf_counter()
+        deadline = now
+        last = now - self.period
+        overrun = False
+        catching_up = 0
+        while self._running:
+            now = time.perf_counter()
+            remaining = deadline - now
+            if remaining > 0:
+                time.sleep(remaining)
+                now = time.perf_counter()
+            lateness = max(0.0, now - deadline)
+            dt = now - last
+            last = now
+            self._record(dt, lateness)
+            yield Tick(self._ticks - 1, now, dt, lateness, overrun)
+
+            deadline += self.period
+            now = time.perf_counter()
+            overrun = now > deadline
+            if not overrun:
+                catching_up = 0
+                continue
+            self._overruns += 1
+            logging.debug(f"{self.name}: tick {self._ticks - 1} overran its period by {(now - deadline)*1e3:.1f} ms")
+            if self.policy == CATCH_UP and catching_up < self.max_catch_up:
+                # Keep the missed deadline: the next tick runs immediately
+                catching_up += 1
+            else:
+                # Drop the missed ticks; the next deadline is the first period boundary after now
+                missed = int((now - deadline) / self.period) + 1
+                deadline += missed * self.period
+                self._skipped += missed
+                catching_up = 0
+
+    def _record(self, dt:float, lateness:float):
+        self._ticks += 1
+        if self._ticks > 1:
+            self._dt_sum += dt
+            self._dt_min = min(self._dt_min, dt)
+            self._dt_max = max(self._dt_max, dt)
+        self._max_lateness = max(self._max_lateness, lateness)
+
+    def stats(self) -> dict:
+        measured = self._ticks - 1
+        return {
+            "name": self.name,
+            "period": self.period,
+            "ticks": self._ticks,
+            "overruns": self._overruns,
+            "skipped": self._skipped,
+            "mean_dt": self._dt_sum / measured if measured > 0 else None,
+            "min_dt": self._dt_min if measured > 0 else None,
+            "max_dt": self._dt_max if measured > 0 else None,
+            "max_lateness": self._max_lateness,
+            }
@@ -0,0 +1,211 @@
+# StateMachine.py
+# Declarative state machines for maneuver sequences, compiled to integer transition tables so that
+# thousands of machines can be stepped per tick.
+#
+#   SPEC = MachineSpec("IDLE", [
+#       Transition("IDLE", "STOP", rising("stopinput", stopHigh), once=True),
+#       Transition("STOP", "TURN", after(1.0)),
+#       Transition("TURN", "IDLE", after(1.5)),
+#       ], on_enter={"STOP": stop_wheels, "TURN": turn_wheels})
+#
+#   machine = SPEC.create(context=robot)
+#   for tick in RateLoop(0.02):
+#       machine.step(time.perf_counter(), ctrl.getValue)
+#
+# Triggers: after(seconds) fires once the machine has been that long in the state (real monotonic
+# time, passed to step); time between pause(now) and resume(now), e.g. while the link is lost, does
+# not count. level(variable, predicate) fires while predicate(value) is true.
+# rising/falling(variable, predicate) fire on the step where it becomes true/false. always() fires
+# on the next step. A guard (guard(machine) -> bool) must also hold. A once=True transition fires
+# at most once per machine. Per state, transitions are tried in the order given. At most one
+# transition is taken per step. Actions get the machine (and machine.context):
+# on_exit[source], then transition.action, then on_enter[target]. during[state] runs at the end of
+# every step spent in state (including the step that entered it), e.g. to re-assert outputs that
+# something else may have overwritten.
+
+AFTER, LEVEL, RISING, FALLING, ALWAYS = range(5)
+
+
+class Trigger:
+    __slots__ = ("kind", "variable", "predicate", "seconds")
+
+    def __init__(self, kind:int, variable:str=None, predicate=None, seconds:float=0.0):
+        self.kind = kind
+        self.variable = variable
+        self.predicate = predicate
+        self.seconds = seconds
+
+
+def after(seconds:float) -> Trigger:
+    return Trigger(AFTER, seconds=seconds)
+
+def level(variable:str, predicate=bool) -> Trigger:
+    return Trigger(LEVEL, variable, predicate)
+
+def rising(variable:str, predicate=bool) -> Trigger:
+    return Trigger(RISING, variable, predicate)
+
+def falling(variable:str, predicate=bool) -> Trigger:
+    return Trigger(FALLING, variable, predicate)
+
+def always() -> Trigger:
+    return Trigger(ALWAYS)
+
+
+class Transition:
+    __slots__ = ("source", "target", "trigger", "guard", "once", "action")
+
+    def __init__(self, source:str, target:str, trigger:Trigger, guard=None, once:bool=False, action=None):
+        self.source = source
+        self.target = target
+        self.trigger = trigger
+        self.guard = guard
+        self.once = once
+        self.action = action
+
+
+class MachineSpec:
+    """
+    Compiled machine definition, shared by all its Machines. States are numbered in order of first
+    appearance (initial first). Each (variable, predicate) signal gets a bit in the level masks.
+    table[state] is a tuple of (kind, argument, guard, target, once_bit, action) rows, where argument
+    is the signal bit, or the seconds for AFTER.
+    """
+
+    def __init__(self, initial:str, transitions:list, on_enter:dict=None, on_exit:dict=None, during:dict=None):
+        self.names = [initial]
+        self.index = {initial: 0}
+        for transition in transitions:
+            for name in (transition.source, transition.target):
+                if name not in self.index:
+                    self.index[name] = len(self.names)
+                    self.names.append(name)
+        for name in list(on_enter or {}) + list(on_exit or {}) + list(during or {}):
+            assert name in self.index, f"Unknown state {name}!"
+
+        self.signals = []
+        signal_bits = {}
+        table = [[] for _ in self.names]
+        once_count = 0
+        for transition in transitions:
+            trigger = transition.trigger
+            argument = trigger.seconds
+            if trigger.kind in (LEVEL, RISING, FALLING):
+                key = (trigger.variable, trigger.predicate)
+                if key not in signal_bits:
+                    signal_bits[key] = 1 << len(self.signals)
+                    self.signals.append(key)
+                argument = signal_bits[key]
+            once_bit = 0
+            if transition.once:
+                once_bit = 1 << once_count
+                once_count += 1
+            table[self.index[transition.source]].append(
+                (trigger.kind, argument, transition.guard, self.index[transition.target], once_bit, transition.action))
+        self.table = tuple(tuple(rows) for rows in table)
+        self.on_enter = tuple((on_enter or {}).get(name, None) for name in self.names)
+        self.on_exit = tuple((on_exit or {}).get(name, None) for name in self.names)
+        self.during = tuple((during or {}).get(name, None) for name in self.names)
+
+    def state(self, name:str) -> int:
+        return self.index[name]
+
+    def create(self, context=None) -> "Machine":
+        return Machine(self, context)
+
+
+class Machine:
+    """One running instance of a MachineSpec. The first step enters the initial state."""
+    __slots__ = ("spec", "state", "entered", "paused", "levels", "fired", "context")
+
+    def __init__(self, spec:MachineSpec, context=None):
+        self.spec = spec
+        self.state = 0
+        self.entered = None
+        self.paused = None
+        self.levels = 0
+        self.fired = 0
+        self.context = context
+
+    @property
+    def name(self) -> str:
+        return self.spec.names[self.state]
+
+    def elapsed(self, now:float) -> float:
+        """Seconds spent in the current state."""
+        return 0.0 if self.entered is None else now - self.entered
+
+    def reset(self):
+        self.state = 0
+        self.entered = None
+        self.paused = None
+        self.levels = 0
+        self.fired = 0
+
+    def pause(self, now:float):
+        """Stop the clock of the current state until resume; the machine must not be stepped meanwhile."""
+        if self.paused is None:
+            self.paused = now
+
+    def resume(self, now:float):
+        """Restart the clock: the time since pause does not count as time in the state."""
+        if self.paused is not None:
+            if self.entered is not None:
+                self.entered += now - self.paused
+            self.paused = None
+
+    def step(self, now:float, read) -> bool:
+        """Evaluate the signals (read(variable) -> value) and take at most one transition."""
+        spec = self.spec
+        if self.entered is None:
+            self.entered = now
+            action = spec.on_enter[self.state]
+            if action is not None:
+                action(self)
+
+        # Signals are evaluated every step, whatever the state, so edges are never missed
+        levels = 0
+        bit = 1
+        for variable, predicate in spec.signals:
+            if predicate(read(variable)):
+                levels |= bit
+            bit <<= 1
+        previous = self.levels
+        self.levels = levels
+
+        taken = False
+        for kind, argument, guard, target, once_bit, action in spec.table[self.state]:
+            if once_bit and self.fired & once_bit:
+                continue
+            if kind == AFTER:
+                if now - self.entered < argument:
+                    continue
+            elif kind == LEVEL:
+                if not levels & argument:
+                    continue
+            elif kind == RISING:
+                if not levels & argument or previous & argument:
+                    continue
+            elif kind == FALLING:
+                if levels & argument or not previous & argument:
+                    continue
+            if guard is not None and not guard(self):
+                continue
+            self.fired |= once_bit
+            exit_action = spec.on_exit[self.state]
+            if exit_action is not None:
+                exit_action(self)
+            if action is not None:
+                action(self)
+            # Timed chains keep their schedule: the next state starts when this one was due to end
+            self.entered = self.entered + argument if kind == AFTER else now
+            self.state = target
+            enter_action = spec.on_enter[target]
+            if enter_action is not None:
+                enter_action(self)
+            taken = True
+            break
+        during = spec.during[self.state]
+        if during is not None:
+            during(self)
+        return taken
@@ -0,0 +1,363 @@
+# Telemetry.py
+# Recording and replay of controller variable changes, to reproduce field incidents offline.
+#
+#   recorder = TelemetryRecorder("run.tlm")
+#   ctrl.setRecorder(recorder)          # every inbound and outbound change is streamed to run.tlm
+#   ...
+#   recorder.close()
+#
+#   replayer = TelemetryReplayer("run.tlm", speed=10.0)
+#   replayer.replay(ctrl)               # feeds the recorded inbound values back into ctrl
+#
+#   python Telemetry.py dump run.tlm
+#
+# Log format (little endian): file header "SMTL", uint8 version, float64 wall-clock session start, then
+# records of float64 session time, uint8 kind, uint16 variable index, payload. A DEFINE record (payload
+# uint8 datatype, uint16 name length, name) gives an index its variable; SNAPSHOT, INBOUND and OUTBOUND
+# records carry a value packed like the binary wire protocol (strings as uint32 length + utf-8).
+# Each file starts with the definitions and current values of all variables, so a rotated file can be
+# replayed on its own. A new recorder rotates away an existing log; the files of one session share the
+# session start of their header, which readSession uses to not chain earlier sessions.
+
+import os
+import glob
+import struct
+import threading
+import argparse
+import time
+import logging
+from Controller import DataType, _BINARY_FORMATS
+
+FILE_MAGIC = b"SMTL"
+FILE_VERSION = 1
+_FILE_HEADER = struct.Struct('<4sBd')
+_RECORD = struct.Struct('<dBH')
+_DEFINE = struct.Struct('<BH')
+_STRLEN = struct.Struct('<I')
+_DATATYPES = list(DataType)
+
+# Record kinds
+DEFINE = 0
+SNAPSHOT = 1    # value of the variable when the file was started
+INBOUND = 2     # received from the peer
+OUTBOUND = 3    # written by the control logic (setValue)
+KIND_NAMES = {DEFINE: "define", SNAPSHOT: "snapshot", INBOUND: "in", OUTBOUND: "out"}
+
+
+def _packer(datatype:DataType):
+    fmt = _BINARY_FORMATS[datatype]
+    return struct.Struct(fmt) if fmt else None
+
+
+class TelemetryRecorder:
+    """
+    Recorder of variable changes, one session per file: an existing log at path is rotated away
+    first, as on overflow. Records are packed into a memory buffer, written out once it holds
+    buffer_size bytes and at the latest flush_interval seconds after the previous write (by a timer
+    if no record follows), and the log rotates to path.1, path.2 ... when it exceeds max_bytes,
+    keeping max_files files in total.
+    Thread safe: inbound changes come from the network thread, outbound ones from the user thread.
+    """
+
+    def __init__(self, path:str, max_bytes:int=16*1024*1024, max_files:int=5, buffer_size:int=64*1024,
+                 flush_interval:float=1.0):
+        assert max_files >= 1, "At least one file must be kept!"
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._file = None
+        self._file_size = 0
+        self._controller = None
+        self._index = {}
+        self._packers = []
+        self._start = time.perf_counter()
+        self._session = time.time()
+        self._last_flush = self._start
+        self._timer = None
+        self._records = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            # A previous session: keep it as path.1 rather than appending to it
+            self._shift()
+        self._open()
+
+    def attach(self, controller):
+        """Called by ControllerBase.setRecorder: define and snapshot the variables of controller."""
+        with self._lock:
+            self._controller = controller
+            self._write_snapshot()
+            self._schedule()
+
+    def inbound(self, name:str, value:any):
+        self._record(INBOUND, name, value)
+
+    def outbound(self, name:str, value:any):
+        self._record(OUTBOUND, name, value)
+
+    def _record(self, kind:int, name:str, value:any):
+        with self._lock:
+            if self._file is None:
+                return
+            now = time.perf_counter()
+            index = self._index.get(name, None)
+            if index is None:
+                index = self._define(name)
+            self._pack(now - self._start, kind, index, value)
+            if len(self._buffer) >= self.buffer_size or now - self._last_flush >= self.flush_interval:
+                self._flush()
+                if self._file_size >= self.max_bytes:
+                    self._rotate()
+            else:
+                self._schedule()
+
+    def _schedule(self):
+        # Called with the lock held: a record followed by silence (e.g. a one-shot stop) is still on
+        # disk within flush_interval, not only at the next record or close
+        if self._timer is None and self._buffer:
+            delay = max(0.0, self._last_flush + self.flush_interval - time.perf_counter())
+            self._timer = threading.Timer(delay, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+            if self._file is not None and self._buffer:
+                self._flush()
+                if self._file_size >= self.max_bytes:
+                    self._rotate()
+
+    def _define(self, name:str) -> int:
+        datatype = self._controller._variables[name].datatype
+        index = len(self._packers)
+        self._index[name] = index
+        self._packers.append(_packer(datatype))
+        raw = name.encode('utf-8')
+        self._buffer += _RECORD.pack(time.perf_counter() - self._start, DEFINE, index)
+        self._buffer += _DEFINE.pack(_DATATYPES.index(datatype), len(raw))
+        self._buffer += raw
+        return index
+
+    def _pack(self, timestamp:float, kind:int, index:int, value:any):
+        self._buffer += _RECORD.pack(timestamp, kind, index)
+        packer = self._packers[index]
+        if packer is None:
+            raw = str(value).encode('utf-8')
+            self._buffer += _STRLEN.pack(len(raw))
+            self._buffer += raw
+        else:
+            self._buffer += packer.pack(value)
+        self._records += 1
+
+    def _write_snapshot(self):
+        if self._controller is None:
+            return
+        timestamp = time.perf_counter() - self._start
+        for name, variable in list(self._controller._variables.items()):
+            index = self._index.get(name, None)
+            if index is None:
+                index = self._define(name)
+            self._pack(timestamp, SNAPSHOT, index, variable.value)
+
+    def _open(self):
+        # Each file holds exactly one session: never append to an existing log
+        self._file = open(self.path, "wb")
+        self._file_size = 0
+        self._buffer += _FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, self._session)
+        self._index = {}
+        self._packers = []
+
+    def _flush(self):
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._file.flush()
+            self._file_size += len(self._buffer)
+            self._buffer.clear()
+        self._last_flush = time.perf_counter()
+
+    def _rotate(self):
+        self._file.close()
+        self._shift()
+        self._open()
+        self._write_snapshot()
+
+    def _shift(self):
+        # path -> path.1 -> path.2 ..., dropping the oldest file beyond max_files
+        if self.max_files > 1:
+            for i in range(self.max_files - 1, 0, -1):
+                source = self.path if i == 1 else f"{self.path}.{i - 1}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{i}")
+        else:
+            os.remove(self.path)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._file is not None:
+                self._flush()
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> dict:
+        return {"records": self._records, "buffered_bytes": len(self._buffer), "file_bytes": self._file_size}
+
+
+def logFiles(path:str) -> list:
+    """The files of a rotated log, oldest first."""
+    rotated = []
+    for name in glob.glob(glob.escape(path) + ".*"):
+        suffix = name[len(path) + 1:]
+        if suffix.isdigit():
+            rotated.append((int(suffix), name))
+    files = [name for _, name in sorted(rotated, reverse=True)]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def logSession(path:str) -> float:
+    """Wall-clock start of the recording session a log file belongs to (None if it has no header)."""
+    with open(path, "rb") as f:
+        header = f.read(_FILE_HEADER.size)
+    if len(header) < _FILE_HEADER.size:
+        return None
+    return _FILE_HEADER.unpack(header)[2]
+
+
+def readLog(path:str):
+    """
+    Yield (time, kind, name, datatype, value) for every record of one log file.
+    DEFINE records are consumed and not yielded.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _FILE_HEADER.size:
+        return
+    magic, version, _ = _FILE_HEADER.unpack_from(data, 0)
+    if magic != FILE_MAGIC or version != FILE_VERSION:
+        raise ValueError(f"{path} is not a telemetry log (version {FILE_VERSION})")
+    offset = _FILE_HEADER.size
+    names, datatypes, packers = {}, {}, {}
+    size = len(data)
+    while offset + _RECORD.size <= size:
+        try:
+            timestamp, kind, index = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+            if kind == DEFINE:
+                code, length = _DEFINE.unpack_from(data, offset)
+                offset += _DEFINE.size
+                names[index] = str(data[offset:offset+length], 'utf-8')
+                offset += length
+                datatypes[index] = _DATATYPES[code]
+                packers[index] = _packer(_DATATYPES[code])
+                continue
+            packer = packers[index]
+            if packer is None:
+                length = _STRLEN.unpack_from(data, offset)[0]
+                offset += _STRLEN.size
+                if offset + length > size:
+                    raise struct.error("truncated string")
+                value = str(data[offset:offset+length], 'utf-8')
+                offset += length
+            else:
+                value = packer.unpack_from(data, offset)[0]
+                offset += packer.size
+        except (KeyError, IndexError, struct.error):
+            # A log cut short by a crash ends with a partial record
+            logging.warning(f"Truncated or corrupt telemetry record at byte {offset} of {path}")
+            return
+        yield timestamp, kind, names[index], datatypes[index], value
+
+
+def readSession(path:str):
+    """Yield the records of every file of the latest session of a rotated log, oldest first."""
+    files = logFiles(path)
+    if not files:
+        return
+    session = logSession(files[-1])
+    for name in files:
+        if logSession(name) == session:
+            yield from readLog(name)
+
+
+class TelemetryReplayer:
+    """
+    Feeds the inbound values of a recorded session into a controller as if they had been received
+    from the peer, at the recorded pace divided by speed (speed=None: as fast as possible).
+    The controller does not need to be started, so control logic can be regression tested without
+    sockets. Recorded outbound values are kept in .expected for comparison with what the logic wrote.
+    """
+
+    def __init__(self, path:str, speed:float=1.0, rotated:bool=True):
+        assert speed is None or speed > 0, "Speed must be positive!"
+        self.path = path
+        self.speed = speed
+        self.rotated = rotated
+        self.expected = []
+        self._running = True
+
+    def stop(self):
+        self._running = False
+
+    def records(self):
+        return readSession(self.path) if self.rotated else readLog(self.path)
+
+    def replay(self, controller, on_record=None) -> int:
+        """
+        Replay into controller; returns the number of inbound values applied. The snapshot opening the
+        log sets the initial values; the snapshots opening rotated files are skipped, so they do not
+        overwrite what the control logic wrote meanwhile. Variables missing from controller are added
+        with their recorded datatype (and first recorded value). on_record(time, kind, name, value) is called
+        after every record, e.g. to step control logic deterministically.
+        """
+        self.expected = []
+        applied = 0
+        start = time.perf_counter()
+        first = None
+        started = False
+        for timestamp, kind, name, datatype, value in self.records():
+            if not self._running:
+                break
+            if first is None:
+                first = timestamp
+            if name not in controller._variables:
+                controller.addVariable(name, datatype, value)
+            if self.speed is not None:
+                delay = start + (timestamp - first) / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if kind == OUTBOUND:
+                started = True
+                self.expected.append((timestamp, name, value))
+            elif kind == INBOUND:
+                started = True
+                controller._apply_received({name: value})
+                applied += 1
+            elif not started:
+                controller._apply_received({name: value})
+            if on_record is not None:
+                on_record(timestamp, kind, name, value)
+        return applied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect controller telemetry logs")
+    parser.add_argument("command", choices=["dump"])
+    parser.add_argument("path")
+    parser.add_argument("--single", action="store_true", help="only this file, not the rotated ones")
+    args = parser.parse_args()
+
+    records = readLog(args.path) if args.single else readSession(args.path)
+    for timestamp, kind, name, datatype, value in records:
+        print(f"{timestamp:12.6f} {KIND_NAMES[kind]:>8} {name} = {value!r}")
@@ -0,0 +1,1270 @@
+# benchmark.py
+# Micro/loopback benchmarks for UDP_Controller.
+# Usage: python benchmark.py [name ...] [--output results.json] [--compare baseline.json]
+# (no name = run all). Results are printed as one JSON object per benchmark; --output also writes
+# them to a file, and --compare prints how each number changed against a previous results file.
+
+import sys
+import os
+import argparse
+import platform
+import subprocess
+from ast import literal_eval
+import time
+import json
+import socket
+import logging
+import statistics
+import threading
+import tracemalloc
+import random
+import math
+import shutil
+import tempfile
+from Controller import UDP_Controller, ControllerBase, BinaryCodec, DataType, ReceiveRing, parseFloats, parseBits, CONNECTED, LOST
+from ControllerHub import ControllerHub
+from FakeSimumatik import FakeGatewayPool
+from RateLoop import RateLoop
+from ColumnLog import ColumnLog, _ColumnWriter
+import RUNROBOT
+from StateMachine import MachineSpec, Transition, after, rising, AFTER
+from ControlEngine import stopHigh
+
+HOST = "127.0.0.1"
+BASE_PORT = 9400
+
+
+class LegacySpinController(UDP_Controller):
+    """Original non-blocking recvfrom + time.sleep(1e-6) loop, kept for comparison."""
+
+    def run(self):
+        _socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        _socket.bind((self._ip, self._port))
+        _socket.settimeout(0)
+
+        while self._running:
+
+            _recv_data = {}
+            _send_data = {}
+
+            try:
+                _data, _addr = _socket.recvfrom(self._max_size)
+                if _addr != self._client_address:
+                    self._client_address = _addr
+                    _socket.sendto(json.dumps({"poll":int(time.perf_counter())}).encode('utf-8'), self._client_address)
+                    continue
+                _recv_data = json.loads(_data.decode('utf-8'))
+            except:
+                pass
+
+            if self._client_address is not None:
+                if _recv_data:
+                    if _recv_data.get("poll", None):
+                        _recv_data.pop("poll")
+                        _send_data.update({"poll":int(time.perf_counter())})
+                    for var_name, var_value in _recv_data.items():
+                        self.setValue(var_name, var_value, send_update=False)
+
+                while self._pending2send:
+                    (var_name, var_value) = self._pending2send.popitem()
+                    _send_data.update({var_name:var_value})
+
+                if _send_data:
+                    _socket.sendto(json.dumps(_send_data).encode('utf-8'), self._client_address)
+
+            time.sleep(1e-6)
+
+        _socket.close()
+
+
+class LegacyDictStore:
+    """Original {"datatype":..., "value":...} per-variable dicts and checkValue if-chain, kept for comparison."""
+
+    def __init__(self):
+        self._variables = {}
+
+    def checkValue(self, value, datatype):
+        if datatype == DataType.BOOL:
+            if isinstance(value, bool):
+                return value
+            elif isinstance(value, str):
+                return value == 'True'
+            else:
+                return False
+        elif datatype in [DataType.BYTE, DataType.WORD, DataType.DWORD, DataType.QWORD, DataType.INT]:
+            return int(value)
+        elif datatype == DataType.FLOAT:
+            return float(value)
+        else:
+            return str(value)
+
+    def addVariable(self, name, datatype, value):
+        assert name not in self._variables, f"Variable {name} already defined!"
+        value = self.checkValue(value, datatype)
+        self._variables.update({name: {"datatype":datatype, "value":value}})
+
+    def setValue(self, name, new_value):
+        assert name in self._variables, f"Variable {name} is not defined!"
+        new_value = self.checkValue(new_value, self._variables[name]["datatype"])
+        if new_value != self._variables[name]["value"]:
+            self._variables[name]["value"] = new_value
+
+    def getValue(self, name):
+        assert name in self._variables, f"Variable {name} is not defined!"
+        return self._variables[name]["value"]
+
+
+class LoopbackPeer:
+    """Minimal stand-in for the Simumatik side: a UDP client talking to a controller."""
+
+    def __init__(self, port:int, timeout:float=1.0):
+        self.address = (HOST, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.settimeout(timeout)
+        self.codec = None
+
+    def send(self, data:dict):
+        if self.codec is not None:
+            self.sock.sendto(self.codec.encode(data), self.address)
+        else:
+            self.sock.sendto(json.dumps(data).encode('utf-8'), self.address)
+
+    def recv(self):
+        _data, _ = self.sock.recvfrom(4096)
+        if self.codec is not None and _data[:1] != b'{':
+            return self.codec.decode(_data)
+        return json.loads(_data.decode('utf-8'))
+
+    def connect(self, binary:bool=False):
+        # First datagram from a new address is answered with a poll and otherwise dropped
+        if binary:
+            self.send({"poll":1, "binary":1})
+        else:
+            self.send({"poll":1})
+        reply = self.recv()
+        if "binary" in reply:
+            self.codec = BinaryCodec(reply["binary"]["table"])
+        return reply
+
+    def close(self):
+        self.sock.close()
+
+
+class LossyPeer(threading.Thread):
+    """Loopback peer that drops a fraction of the datagrams in both directions and acks sequenced packets."""
+
+    def __init__(self, port:int, loss:float, reliable:bool=True, seed:int=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.peer = LoopbackPeer(port, timeout=0.05)
+        self.loss = loss
+        self.reliable = reliable
+        self.random = random.Random(seed)
+        self.running = True
+        self.received = {}
+
+    def run(self):
+        while self.running:
+            try:
+                data = self.peer.recv()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if self.random.random() < self.loss:
+                continue
+            seq = data.pop("seq", None)
+            data.pop("poll", None)
+            self.received.update(data)
+            if seq is not None and self.random.random() >= self.loss:
+                self.peer.send({"ack": seq})
+
+    def connect(self):
+        # The handshake itself is not subject to loss
+        self.peer.send({"poll":1, "reliable":1} if self.reliable else {"poll":1})
+        self.peer.recv()
+        self.start()
+
+    def close(self):
+        self.running = False
+        self.join(1.0)
+        self.peer.close()
+
+
+def _start(controller_cls, port:int):
+    ctrl = controller_cls(ip=HOST, port=port, log_lever=logging.WARNING)
+    ctrl.addVariable("left_speed", DataType.FLOAT, 0.0)
+    ctrl.addVariable("sensor", DataType.STRING, "")
+    ctrl.start()
+    time.sleep(0.1)
+    return ctrl
+
+
+def _summary(samples_us:list):
+    samples_us = sorted(samples_us)
+    return {
+        "n": len(samples_us),
+        "mean_us": round(statistics.fmean(samples_us), 2),
+        "p50_us": round(samples_us[len(samples_us)//2], 2),
+        "p99_us": round(samples_us[int(len(samples_us)*0.99)-1], 2),
+        "max_us": round(samples_us[-1], 2),
+        }
+
+
+def _histogram(samples_ms:list, edges_ms:tuple=(0.5, 1, 2, 5, 10, 15, 20, 25, 30, 50, 100)):
+    bins = {f"<={edge}ms": 0 for edge in edges_ms}
+    bins[f">{edges_ms[-1]}ms"] = 0
+    for sample in samples_ms:
+        for edge in edges_ms:
+            if sample <= edge:
+                bins[f"<={edge}ms"] += 1
+                break
+        else:
+            bins[f">{edges_ms[-1]}ms"] += 1
+    return bins
+
+
+def _idle_cpu(controller_cls, port:int, seconds:float):
+    ctrl = _start(controller_cls, port)
+    peer = LoopbackPeer(port)
+    peer.connect()
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    time.sleep(seconds)
+    cpu = time.process_time() - cpu0
+    wall = time.perf_counter() - wall0
+    ctrl.close()
+    ctrl.join(1.0)
+    peer.close()
+    return round(100.0 * cpu / wall, 2)
+
+
+def _round_trip(controller_cls, port:int, count:int):
+    ctrl = _start(controller_cls, port)
+    peer = LoopbackPeer(port)
+    peer.connect()
+    inbound, outbound = [], []
+    for i in range(count):
+        # peer -> controller -> peer (poll echo)
+        t0 = time.perf_counter()
+        peer.send({"poll":1, "sensor":str(i)})
+        peer.recv()
+        inbound.append((time.perf_counter() - t0) * 1e6)
+        # setValue -> wire
+        t0 = time.perf_counter()
+        ctrl.setValue("left_speed", float(i + 1))
+        peer.recv()
+        outbound.append((time.perf_counter() - t0) * 1e6)
+    ctrl.close()
+    ctrl.join(1.0)
+    peer.close()
+    return {"poll_rtt": _summary(inbound), "setvalue_to_wire": _summary(outbound)}
+
+
+def bench_run_loop(seconds:float=2.0, count:int=2000):
+    """Idle CPU (% of one core) and latencies: selector loop vs legacy busy-spin."""
+    results = {}
+    for offset, (label, cls) in enumerate((("selector", UDP_Controller), ("legacy_spin", LegacySpinController))):
+        port = BASE_PORT + offset
+        results[label] = {
+            "idle_cpu_percent": _idle_cpu(cls, port, seconds),
+            **_round_trip(cls, port + 10, count),
+            }
+    return results
+
+
+def bench_wire(count:int=20000):
+    """Encode/decode cost and bytes per packet: binary framing vs JSON, for a typical robot update."""
+    ctrl = ControllerBase(log_lever=logging.WARNING)
+    ctrl.addVariable("left_speed", DataType.FLOAT, 0.0)
+    ctrl.addVariable("right_speed", DataType.FLOAT, 0.0)
+    ctrl.addVariable("sensor", DataType.STRING, "")
+    ctrl.addVariable("stopinput", DataType.STRING, "")
+    ctrl.addVariable("digital_inputs1", DataType.BYTE, 0)
+    codec = BinaryCodec([(name, variable.datatype) for name, variable in ctrl._variables.items()])
+    packets = {
+        "speeds": {"left_speed": 2.8802, "right_speed": -2.8802},
+        "inputs": {"poll": 123, "sensor": "00011000", "stopinput": "[24,0,0]", "digital_inputs1": 5},
+        }
+    results = {}
+    for label, packet in packets.items():
+        json_bytes = json.dumps(packet).encode('utf-8')
+        binary_bytes = codec.encode(packet)
+        row = {"json_bytes": len(json_bytes), "binary_bytes": len(binary_bytes)}
+        for fmt, encode, decode, raw in (
+                ("json", lambda d: json.dumps(d).encode('utf-8'), lambda b: json.loads(b.decode('utf-8')), json_bytes),
+                ("binary", codec.encode, codec.decode, binary_bytes)):
+            t0 = time.perf_counter()
+            for _ in range(count):
+                encode(packet)
+            t1 = time.perf_counter()
+            for _ in range(count):
+                decode(raw)
+            t2 = time.perf_counter()
+            row[f"{fmt}_encode_us"] = round((t1 - t0) / count * 1e6, 3)
+            row[f"{fmt}_decode_us"] = round((t2 - t1) / count * 1e6, 3)
+        results[label] = row
+    return results
+
+
+def bench_store_stress(writers:int=4, writes:int=20000):
+    """
+    Hammer the variable store from several threads and check that no update is lost or reordered,
+    and that getValues never sees a half-applied datagram.
+    """
+    ctrl = ControllerBase(log_lever=logging.WARNING)
+    for w in range(writers):
+        ctrl.addVariable(f"out{w}", DataType.INT, 0)
+    ctrl.addVariable("x", DataType.INT, 0)
+    ctrl.addVariable("y", DataType.INT, 0)
+    done = threading.Event()
+    seen = {f"out{w}": [] for w in range(writers)}
+    errors = {"reordered": 0, "torn_snapshots": 0}
+
+    def writer(name):
+        for i in range(1, writes + 1):
+            ctrl.setValue(name, i)
+
+    def network():
+        # Plays the network thread: flush outbound writes and apply inbound datagrams
+        i = 0
+        while not done.is_set() or ctrl._pending2send:
+            for name, value in ctrl._collect_pending({}).items():
+                seen[name].append(value)
+            i += 1
+            ctrl._apply_received({"x": i, "y": i})
+
+    def reader():
+        while not done.is_set():
+            x, y = ctrl.getValues(["x", "y"])
+            if x != y:
+                errors["torn_snapshots"] += 1
+
+    threads = [threading.Thread(target=writer, args=(f"out{w}",)) for w in range(writers)]
+    helpers = [threading.Thread(target=network), threading.Thread(target=reader)]
+    t0 = time.perf_counter()
+    for t in helpers + threads:
+        t.start()
+    for t in threads:
+        t.join()
+    done.set()
+    for t in helpers:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    lost = 0
+    packets = 0
+    for name, values in seen.items():
+        packets += len(values)
+        if not values or values[-1] != writes:
+            lost += 1
+        errors["reordered"] += sum(1 for a, b in zip(values, values[1:]) if b <= a)
+    results = {
+        "writes": writers * writes,
+        "coalesced_to": packets,
+        "lost_final_values": lost,
+        **errors,
+        "writes_per_sec": round(writers * writes / elapsed),
+        "ok": lost == 0 and not any(errors.values()),
+        }
+    assert results["ok"], f"Store stress failed: {lost} final values lost, {errors['reordered']} reordered, {errors['torn_snapshots']} torn snapshots"
+    return results
+
+
+def bench_variables(count:int=10000, calls:int=200000):
+    """Memory and per-call getValue/setValue latency for an I/O map of count variables."""
+    datatypes = [DataType.BOOL, DataType.BYTE, DataType.WORD, DataType.INT, DataType.FLOAT]
+    names = [f"io_{i}" for i in range(count)]
+    results = {}
+    for label, factory in (("typed_columns", lambda: ControllerBase(log_lever=logging.WARNING)), ("legacy_dicts", LegacyDictStore)):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        store = factory()
+        for i, name in enumerate(names):
+            store.addVariable(name, datatypes[i % len(datatypes)], 0)
+        memory = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        probe = [names[(i * 7919) % count] for i in range(1024)]
+        t0 = time.perf_counter()
+        for i in range(calls):
+            store.getValue(probe[i & 1023])
+        t1 = time.perf_counter()
+        for i in range(calls):
+            store.setValue(probe[i & 1023], i & 1)
+        t2 = time.perf_counter()
+        results[label] = {
+            "variables": count,
+            "memory_bytes": memory,
+            "bytes_per_variable": round(memory / count, 1),
+            "getValue_ns": round((t1 - t0) / calls * 1e9, 1),
+            "setValue_ns": round((t2 - t1) / calls * 1e9, 1),
+            }
+    return results
+
+
+def bench_critical_stop(trials:int=20, loss:float=0.5):
+    """
+    How often the final zero speed reaches a peer dropping loss of all datagrams when the script exits
+    right after writing it: plain close(), close(drain=True) with acks, and with blind repetition.
+    """
+    results = {}
+    port = BASE_PORT + 100
+    for label, drain, reliable in (("close", False, True), ("drain_acked", True, True), ("drain_repeated", True, False)):
+        delivered = 0
+        elapsed = []
+        for trial in range(trials):
+            port += 1
+            ctrl = _start(UDP_Controller, port)
+            ctrl.setCritical("left_speed", retries=20, retry_interval=0.01)
+            peer = LossyPeer(port, loss, reliable, seed=trial)
+            peer.connect()
+            ctrl.setValue("left_speed", 3.0)
+            time.sleep(0.05)
+            t0 = time.perf_counter()
+            ctrl.setValue("left_speed", 0.0)
+            ctrl.close(drain=drain)
+            elapsed.append((time.perf_counter() - t0) * 1e3)
+            ctrl.join(1.0)
+            time.sleep(0.05)
+            peer.close()
+            delivered += peer.received.get("left_speed", None) == 0.0
+        results[label] = {
+            "trials": trials,
+            "loss": loss,
+            "zero_delivered": delivered,
+            "mean_close_ms": round(statistics.fmean(elapsed), 2),
+            }
+    for label in ("drain_acked", "drain_repeated"):
+        # Plain close() is the lossy baseline; a draining close must deliver the zero every time
+        assert results[label]["zero_delivered"] == trials, f"{label}: zero delivered in {results[label]['zero_delivered']}/{trials} trials"
+    return results
+
+
+def _line_follow(robot):
+    # RUNROBOT.py control law
+    s = (robot.getValue("sensor") or "")[:8].ljust(8, "0")
+    steer = sum(w*b for w, b in zip((-3,-2,-1,-0.5, 0.5,1,2,3), (1 if c == "1" else 0 for c in s)))
+    robot.setValue("left_speed", max(-1.0, min(1.0, 0.6 - 0.4*steer)))
+    robot.setValue("right_speed", max(-1.0, min(1.0, 0.6 + 0.4*steer)))
+
+
+def bench_fleet(robots:int=200, seconds:float=3.0, rate:float=100.0, loss:float=0.0):
+    """A ControllerHub running the RUNROBOT control law for a fleet of fake gateways in one process."""
+    port = BASE_PORT + 1000
+    hub = ControllerHub(ip=HOST, log_lever=logging.WARNING)
+    for i in range(robots):
+        robot = hub.addRobot(port + i)
+        robot.addVariable("sensor", DataType.STRING, "")
+        robot.addVariable("stopinput", DataType.STRING, "")
+        robot.addVariable("left_speed", DataType.FLOAT, 0.0)
+        robot.addVariable("right_speed", DataType.FLOAT, 0.0)
+        hub.schedule(0.02, _line_follow, robot)
+    pool = FakeGatewayPool()
+    for i in range(robots):
+        pool.add(port + i, ip=HOST, rate=rate, loss=loss, seed=i)
+    hub.start()
+    pool.start()
+    time.sleep(0.5)
+    stats0 = pool.stats()
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    time.sleep(seconds)
+    cpu = time.process_time() - cpu0
+    wall = time.perf_counter() - wall0
+    stats1 = pool.stats()
+    pool.close()
+    pool.join(1.0)
+    hub.close()
+    hub.join(1.0)
+    sent = stats1["sent"] - stats0["sent"]
+    received = stats1["received"] - stats0["received"]
+    return {
+        "robots": robots,
+        "gateway_packets_per_sec": round(sent / wall),
+        "controller_packets_per_sec": round(received / wall),
+        "cpu_percent_total": round(100.0 * cpu / wall, 1),
+        "mean_abs_line_error_m": round(statistics.fmean(abs(g.robot.y) for g in pool.gateways), 4),
+        "mean_distance_m": round(statistics.fmean(g.robot.x for g in pool.gateways), 3),
+        }
+
+
+def bench_latency(count:int=2000):
+    """setValue -> wire (user thread to peer socket) and wire -> getValue (peer socket to user thread)."""
+    port = BASE_PORT + 200
+    ctrl = _start(UDP_Controller, port)
+    peer = LoopbackPeer(port)
+    peer.connect()
+    to_wire, to_value = [], []
+    for i in range(1, count + 1):
+        t0 = time.perf_counter()
+        ctrl.setValue("left_speed", float(i))
+        peer.recv()
+        to_wire.append((time.perf_counter() - t0) * 1e6)
+
+        value = str(i)
+        t0 = time.perf_counter()
+        peer.send({"sensor": value})
+        while ctrl.getValue("sensor") != value:
+            time.sleep(0)   # let the network thread have the GIL
+        to_value.append((time.perf_counter() - t0) * 1e6)
+    ctrl.close()
+    ctrl.join(1.0)
+    peer.close()
+    return {"setvalue_to_wire": _summary(to_wire), "wire_to_getvalue": _summary(to_value)}
+
+
+def _parse_stop(raw):
+    try:
+        return literal_eval(raw) if raw else [0, 0, 0]
+    except (ValueError, SyntaxError):
+        return [0, 0, 0]
+
+# Per-tick work of each script, with the loop period it assumes: (dt, setup, body)
+def _loop_runrobot(ctrl, state):
+    _line_follow(ctrl)
+
+def _loop_decay(ctrl, state):
+    state["left"] = state.get("left", 3.0) * 0.96
+    state["right"] = state.get("right", 3.0) * 0.96
+    ctrl.setValue("left_speed", state["left"])
+    ctrl.setValue("right_speed", state["right"])
+
+def _loop_teleop_auto(ctrl, state):
+    raw = ctrl.getValue("stopinput")
+    stop_vec = eval(raw) if raw else [0, 0, 0]
+    ctrl.setValue("left_speed", 0.0 if float(stop_vec[0]) >= 24.0 else 3.0)
+    ctrl.setValue("right_speed", 0.0 if float(stop_vec[0]) >= 24.0 else 3.0)
+
+def _loop_level_stop(ctrl, state):
+    stop_vec = _parse_stop(ctrl.getValue("stopinput"))
+    ctrl.setValue("left_speed", 0.0 if float(stop_vec[0]) >= 24.0 else 6.0)
+    ctrl.setValue("right_speed", 0.0 if float(stop_vec[0]) >= 24.0 else 6.0)
+
+def _loop_plc(ctrl, state):
+    inputs1, inputs2 = ctrl.getMappedValues(["digital_inputs1", "digital_inputs2"])
+    ctrl.setMappedValue("digital_outputs1", [False, inputs1[6], inputs1[5], not inputs1[7], False, inputs1[7], False, inputs1[7]])
+
+SCRIPT_LOOPS = {
+    "RUNROBOT": (0.02, _loop_runrobot),
+    "manual": (0.01, _loop_decay),
+    "teleop_auto": (0.02, _loop_teleop_auto),
+    "teleop_manual": (0.01, _loop_decay),
+    "1strobot": (0.02, _loop_level_stop),
+    "Python": (1e-5, _loop_plc),
+    }
+
+
+def _measure_loop(ctrl, dt:float, body, seconds:float, rate_loop:bool):
+    state = {}
+    periods = []
+    nominal_timer = 0.0
+    t_start = last = time.perf_counter()
+    if rate_loop:
+        loop = RateLoop(dt)
+        for tick in loop:
+            if tick.index:
+                periods.append(tick.dt * 1e3)
+                nominal_timer += dt
+                last = tick.time
+            if last - t_start >= seconds:
+                break
+            body(ctrl, state)
+    else:
+        while last - t_start < seconds:
+            body(ctrl, state)
+            time.sleep(dt)
+            now = time.perf_counter()
+            periods.append((now - last) * 1e3)
+            nominal_timer += dt   # what teleop_robot.py's seq_timer did
+            last = now
+    elapsed = last - t_start
+    periods_us = [p * 1e3 for p in periods]
+    return {
+        "ticks": len(periods),
+        "period": _summary(periods_us),
+        "jitter_us": round(statistics.pstdev(periods_us), 2),
+        "nominal_timer_drift_percent": round(100.0 * (elapsed - nominal_timer) / elapsed, 2),
+        "histogram": _histogram(periods),
+        }
+
+
+def bench_loops(seconds:float=1.0):
+    """
+    Real loop period of each script's control law against a fake gateway, with the original
+    work + time.sleep(dt) loop and with RateLoop deadlines.
+    """
+    results = {}
+    port = BASE_PORT + 300
+    for name, (dt, body) in SCRIPT_LOOPS.items():
+        port += 1
+        ctrl = UDP_Controller(ip=HOST, port=port, log_lever=logging.WARNING)
+        for var in ("left_speed", "right_speed"):
+            ctrl.addVariable(var, DataType.FLOAT, 0.0)
+        for var in ("sensor", "stopinput"):
+            ctrl.addVariable(var, DataType.STRING, "")
+        for var in ("digital_inputs1", "digital_inputs2", "digital_outputs1"):
+            ctrl.addVariable(var, DataType.BYTE, 0)
+        ctrl.start()
+        pool = FakeGatewayPool()
+        pool.add(port, ip=HOST)
+        pool.start()
+        time.sleep(0.1)
+
+        results[name] = {
+            "nominal_dt_ms": dt * 1e3,
+            "sleep": _measure_loop(ctrl, dt, body, seconds, rate_loop=False),
+            "rate_loop": _measure_loop(ctrl, dt, body, seconds, rate_loop=True),
+            }
+
+        pool.close()
+        pool.join(1.0)
+        ctrl.close()
+        ctrl.join(1.0)
+    return results
+
+
+def bench_throughput(seconds:float=1.0):
+    """Packets/sec ceilings: inbound (peer floods, controller replies to each poll) and outbound (setValue flood)."""
+    port = BASE_PORT + 400
+    ctrl = _start(UDP_Controller, port)
+    peer = LoopbackPeer(port, timeout=0.2)
+    peer.connect()
+
+    # Inbound: keep a bounded window of datagrams in flight and count the replies
+    window = 32
+    sent = replies = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        while sent - replies < window:
+            sent += 1
+            peer.send({"poll":sent, "sensor":str(sent)})
+        try:
+            peer.recv()
+            replies += 1
+        except socket.timeout:
+            replies = sent
+    inbound = replies / (time.perf_counter() - t0)
+
+    # Outbound: setValue as fast as possible, count what reaches the peer
+    stop = threading.Event()
+    def writer():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            ctrl.setValue("left_speed", float(i))
+    thread = threading.Thread(target=writer)
+    received = 0
+    thread.start()
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        try:
+            peer.recv()
+            received += 1
+        except socket.timeout:
+            break
+    outbound = received / (time.perf_counter() - t0)
+    stop.set()
+    thread.join()
+    ctrl.close()
+    ctrl.join(1.0)
+    peer.close()
+    return {"inbound_packets_per_sec": round(inbound), "outbound_packets_per_sec": round(outbound)}
+
+
+def bench_receive(packets:int=50000, batch:int=32):
+    """
+    Receive path cost: recvfrom + bytes.decode (original) vs recvfrom_into a ReceiveRing decoded in place.
+    Reports packets/sec through drain + decode, and the heap bytes allocated to receive one datagram,
+    before decoding (tracemalloc peak).
+    """
+    ctrl = ControllerBase(log_lever=logging.WARNING)
+    ctrl.addVariable("sensor", DataType.STRING, "")
+    ctrl.addVariable("stopinput", DataType.STRING, "")
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind((HOST, 0))
+    receiver.setblocking(False)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    raw = json.dumps({"poll":123, "sensor":"00011000", "stopinput":"[24,0,0]"}).encode('utf-8')
+    ring = ReceiveRing(ctrl._max_size, batch)
+    stats = {"receive_errors": 0}
+
+    def legacy():
+        datagrams = []
+        while True:
+            try:
+                _data, _addr = receiver.recvfrom(ctrl._max_size)
+            except BlockingIOError:
+                return datagrams
+            datagrams.append(_data)
+
+    def zero_copy():
+        return [ring.datagram(index) for index in range(ring.fill(receiver, stats))]
+
+    results = {}
+    for label, receive in (("recvfrom", legacy), ("recvfrom_into", zero_copy)):
+        elapsed = 0.0
+        received = 0
+        for i in range(packets // batch):
+            for _ in range(batch):
+                sender.sendto(raw, receiver.getsockname())
+            t0 = time.perf_counter()
+            for _data in receive():
+                ctrl._decode(_data)
+                received += 1
+            elapsed += time.perf_counter() - t0
+        # Heap use of receiving one datagram, traced separately as tracemalloc is slow
+        peaks = []
+        for _ in range(200):
+            sender.sendto(raw, receiver.getsockname())
+            time.sleep(0)
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            datagrams = receive()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+            tracemalloc.stop()
+            del datagrams
+        results[label] = {
+            "packets": received,
+            "packets_per_sec": round(received / elapsed),
+            "receive_bytes_per_packet": statistics.median(peaks),
+            }
+    receiver.close()
+    sender.close()
+    return results
+
+
+def bench_column_log(minutes:float=60.0, rate:float=100.0):
+    """
+    Load a 5 minute window of one robot's left_speed and sensor out of a recorded session:
+    JSON lines (one {"t", "port", "name", "value"} object per change) vs the mmap ColumnLog.
+    """
+    directory = tempfile.mkdtemp(prefix="simumatik_bench_")
+    count = int(minutes * 60 * rate)
+    t0 = 1.7e9
+    json_path = os.path.join(directory, "session.jsonl")
+    robot_directory = os.path.join(directory, "8500")
+    os.makedirs(robot_directory)
+    columns = {name: _ColumnWriter(robot_directory, name, datatype, 1 << 20)
+               for name, datatype in (("left_speed", DataType.FLOAT), ("sensor", DataType.STRING))}
+    with open(json_path, "w") as f:
+        for i in range(count):
+            timestamp = t0 + i / rate
+            values = {"left_speed": 3.0 * math.sin(i / 500), "sensor": format((i // 7) & 0xFF, '08b')}
+            for name, value in values.items():
+                f.write(json.dumps({"t": timestamp, "port": 8500, "name": name, "value": value}) + "\n")
+                columns[name].append(timestamp, value)
+    for column in columns.values():
+        column.close()
+
+    start = t0 + minutes * 60 / 2
+    end = start + 300
+    results = {"records_per_variable": count,
+               "json_bytes": os.path.getsize(json_path),
+               "column_bytes": sum(os.path.getsize(os.path.join(robot_directory, name)) for name in os.listdir(robot_directory))}
+
+    t1 = time.perf_counter()
+    loaded = {"left_speed": ([], []), "sensor": ([], [])}
+    with open(json_path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record["port"] == 8500 and start <= record["t"] < end and record["name"] in loaded:
+                times, values = loaded[record["name"]]
+                times.append(record["t"])
+                values.append(record["value"])
+    t2 = time.perf_counter()
+    log = ColumnLog(directory)
+    speed_times, speeds = log.query(8500, "left_speed", start, end)
+    sensor_times, sensors = log.query(8500, "sensor", start, end)
+    t3 = time.perf_counter()
+    assert len(speeds) == len(loaded["left_speed"][1]) and list(sensors) == loaded["sensor"][1]
+    t4 = time.perf_counter()
+    log.query(8500, "left_speed", start, end)
+    t5 = time.perf_counter()
+    results.update({
+        "window_records": len(speeds),
+        "json_lines_ms": round((t2 - t1) * 1e3, 2),
+        "column_log_ms": round((t3 - t2) * 1e3, 3),
+        "column_log_numeric_only_ms": round((t5 - t4) * 1e3, 3),
+        "numpy": "numpy" in sys.modules,
+        })
+    del speed_times, speeds, sensor_times, sensors
+    shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def bench_line_follow(sizes:tuple=(1, 100, 10000), repeat:float=0.5):
+    """
+    Per-robot cost of one RUNROBOT control step for N robots: per-robot control() vs control_batch()
+    (numpy when installed, else the sensor table), on the law alone and with the variable reads/writes.
+    """
+    rng = random.Random(1)
+    results = {"numpy": RUNROBOT.np is not None}
+    for size in sizes:
+        sensors = ["".join(rng.choice("0001") for _ in range(8)) for _ in range(size)]
+        robots = []
+        for sensor in sensors:
+            robot = ControllerBase(log_lever=logging.WARNING)
+            robot.addVariable("sensor", DataType.STRING, sensor)
+            robot.addVariable("left_speed", DataType.FLOAT, 0.0)
+            robot.addVariable("right_speed", DataType.FLOAT, 0.0)
+            robots.append(robot)
+
+        def per_robot_swarm():
+            for robot in robots:
+                left, right = RUNROBOT.control(robot.getValue("sensor"))
+                robot.setValue("left_speed", left)
+                robot.setValue("right_speed", right)
+
+        row = {}
+        for label, step in (("per_robot_law", lambda: [RUNROBOT.control(sensor) for sensor in sensors]),
+                            ("batch_law", lambda: RUNROBOT.control_batch(sensors)),
+                            ("per_robot_step", per_robot_swarm),
+                            ("batch_step", lambda: RUNROBOT.control_swarm(robots))):
+            step()
+            calls = 0
+            t0 = time.perf_counter()
+            while time.perf_counter() - t0 < repeat:
+                step()
+                calls += 1
+            row[f"{label}_us_per_robot"] = round((time.perf_counter() - t0) / calls / size * 1e6, 3)
+        results[f"N={size}"] = row
+    return results
+
+
+class _LegacySequence:
+    """teleop_robot.py's original hand-coded STOP->TURN->STRAIGHT sequence, kept for comparison."""
+
+    def __init__(self):
+        self.seq_state, self.seq_timer, self.seq_active, self.seq_armed = "IDLE", 0.0, False, True
+        self.prev_stop_high = False
+        self.left = self.right = 0.0
+
+    def step(self, raw_stop, dt):
+        stop_high = stopHigh(raw_stop)
+        rising_edge = stop_high and not self.prev_stop_high
+        self.prev_stop_high = stop_high
+        if self.seq_armed and not self.seq_active and self.seq_state == "IDLE" and rising_edge:
+            self.seq_active, self.seq_armed, self.seq_state, self.seq_timer = True, False, "STOP", 0.0
+        if self.seq_state != "IDLE":
+            self.seq_timer += dt
+            if self.seq_state == "STOP" and self.seq_timer >= 1.0:
+                self.seq_state, self.seq_timer = "TURN", 0.0
+            elif self.seq_state == "TURN" and self.seq_timer >= 1.5:
+                self.seq_state, self.seq_timer = "STRAIGHT", 0.0
+            elif self.seq_state == "STRAIGHT" and self.seq_timer >= 5:
+                self.seq_state, self.seq_timer = "IDLE", 0.0
+                self.seq_active = False
+            if self.seq_state == "STOP":
+                self.left = self.right = 0.0
+            elif self.seq_state == "TURN":
+                self.left, self.right = 3.0, -3.0
+            elif self.seq_state == "STRAIGHT":
+                self.left = self.right = 2.0
+
+
+def bench_state_machines(count:int=10000, ticks:int=200):
+    """
+    Per-machine cost of one 20 ms tick of the stopinput sequence for a fleet of count robots:
+    the original hand-coded if/elif version vs a compiled StateMachine. Every 7th robot sees
+    stopinput go to 24 V halfway through.
+    """
+    class Wheels:
+        __slots__ = ("left", "right")
+    def drive_with(left, right):
+        def action(machine):
+            machine.context.left, machine.context.right = left, right
+        return action
+    spec = MachineSpec("IDLE", [
+        Transition("IDLE", "STOP", rising("stopinput", stopHigh), once=True),
+        Transition("STOP", "TURN", after(1.0)),
+        Transition("TURN", "STRAIGHT", after(1.5)),
+        Transition("STRAIGHT", "IDLE", after(5.0)),
+        ], on_enter={"STOP": drive_with(0.0, 0.0), "TURN": drive_with(3.0, -3.0), "STRAIGHT": drive_with(2.0, 2.0)})
+    inputs = [{"stopinput": "[0,0,0]"} for _ in range(count)]
+    legacy = [_LegacySequence() for _ in range(count)]
+    machines = [spec.create(Wheels()) for _ in range(count)]
+
+    results = {"machines": count, "states": len(spec.names), "signals": len(spec.signals)}
+    for label, step in (("hand_coded", lambda i, now: legacy[i].step(inputs[i]["stopinput"], 0.02)),
+                        ("state_machine", lambda i, now: machines[i].step(now, inputs[i].get))):
+        for values in inputs:
+            values["stopinput"] = "[0,0,0]"
+        t0 = time.perf_counter()
+        for tick in range(ticks):
+            if tick == ticks // 2:
+                for values in inputs[::7]:
+                    values["stopinput"] = "[24,0,0]"
+            now = tick * 0.02
+            for i in range(count):
+                step(i, now)
+        results[f"{label}_us_per_machine"] = round((time.perf_counter() - t0) / ticks / count * 1e6, 3)
+    results["in_sequence"] = sum(1 for machine in machines if machine.name != "IDLE")
+    results["jittered_durations"] = _check_sequence_timing(spec, Wheels())
+    results["paused_durations"] = _check_sequence_timing(spec, Wheels(), pause=3.0)
+    return results
+
+
+def _check_sequence_timing(spec:MachineSpec, context, tick:float=0.01, period:float=0.02, jitter:float=0.0002,
+                           pause:float=0.0) -> dict:
+    """
+    Step one machine through the sequence as ControlEngine does: at the first tick (with jitter) at
+    least period after the previous step, so steps are 20-30 ms apart. With pause, the machine is
+    paused that long halfway through STOP and TURN, as while the link is lost. Each timed state must
+    last its after() duration (plus the pause) to within one step, and the whole sequence must not drift.
+    """
+    rng = random.Random(1)
+    machine = spec.create(context)
+    values = {"stopinput": "[24,0,0]"}
+    durations = {}
+    now = next_time = 0.0
+    entered, state, started = None, None, None
+    paused = set()
+    while len(durations) < 3:
+        if now >= next_time:
+            machine.step(now, values.get)
+            next_time = now + period
+            if machine.name != state:
+                if state in ("STOP", "TURN", "STRAIGHT"):
+                    durations[state] = round(now - entered, 3)
+                if machine.name == "STOP":
+                    started = now
+                entered, state = now, machine.name
+            if pause and state in ("STOP", "TURN") and state not in paused and now - entered >= 0.5:
+                paused.add(state)
+                machine.pause(now)
+                now += pause
+                machine.resume(now)
+        now += tick + rng.uniform(0.0, jitter)
+    expected = {name: rows[0][1] for name, rows in zip(spec.names, spec.table) if rows and rows[0][0] == AFTER}
+    step = period + tick + jitter
+    for name, duration in durations.items():
+        assert abs(duration - pause * (name in paused) - expected[name]) <= step, f"{name} lasted {duration} s"
+    total = entered - started - pause * len(paused)
+    assert abs(total - sum(expected[name] for name in durations)) <= step, f"The sequence lasted {total:.3f} s"
+    return durations
+
+
+def bench_input_wait(events:int=50, interval:float=0.02, poll_period:float=0.001):
+    """
+    Reacting to stopinput going high: a poll loop (getValue + stopHigh every poll_period, as the
+    scripts did) vs waitFor and a rising-edge subscribe. Reports the reaction latency and the CPU
+    time the reacting thread burned over the whole run.
+    """
+    port = BASE_PORT + 500
+    ctrl = _start(UDP_Controller, port)
+    ctrl.addVariable("stopinput", DataType.STRING, "")
+    peer = LoopbackPeer(port)
+    peer.connect()
+
+    def pulses(reacted):
+        # Each pulse waits until the reaction to the previous one was seen
+        sent = []
+        for i in range(events):
+            time.sleep(interval)
+            peer.send({"stopinput": "[0,0,0]"})
+            time.sleep(interval)
+            sent.append(time.perf_counter())
+            peer.send({"stopinput": f"[24,{i},0]"})
+            while len(reacted) <= i:
+                time.sleep(1e-4)
+        return sent
+
+    results = {}
+    for label in ("poll", "wait_for", "subscribe"):
+        reacted, cpu = [], []
+        done = threading.Event()
+        def poll():
+            t0 = time.thread_time()
+            previous = False
+            while not done.is_set():
+                high = stopHigh(ctrl.getValue("stopinput"))
+                if high and not previous:
+                    reacted.append(time.perf_counter())
+                previous = high
+                time.sleep(poll_period)
+            cpu.append(time.thread_time() - t0)
+        def wait_for():
+            t0 = time.thread_time()
+            while not done.is_set():
+                if ctrl.waitFor("stopinput", stopHigh, 0.1):
+                    reacted.append(time.perf_counter())
+                    ctrl.waitFor("stopinput", lambda raw: not stopHigh(raw) or done.is_set(), 0.1)
+            cpu.append(time.thread_time() - t0)
+        if label == "subscribe":
+            subscription = ctrl.subscribe("stopinput", lambda name, raw: reacted.append(time.perf_counter()),
+                                          edge="rising", predicate=stopHigh)
+            sent = pulses(reacted)
+            ctrl.unsubscribe(subscription)
+        else:
+            waiter = threading.Thread(target=poll if label == "poll" else wait_for)
+            waiter.start()
+            sent = pulses(reacted)
+            done.set()
+            ctrl.setValue("stopinput", "[0,0,0]", send_update=False)
+            waiter.join()
+        results[label] = _summary([(r - s) * 1e6 for s, r in zip(sent, reacted)])
+        if cpu:
+            results[label]["reacting_cpu_ms"] = round(cpu[0] * 1e3, 2)
+        ctrl.setValue("stopinput", "[0,0,0]", send_update=False)
+    ctrl.close()
+    ctrl.join(1.0)
+    peer.close()
+    return results
+
+
+def bench_structured(calls:int=100000):
+    """
+    Per-tick cost of reading stopinput and sensor as the scripts used to (eval / literal_eval /
+    parse_sensor on the raw string every tick) vs structured variables parsed once per change,
+    and what the parse adds to applying an inbound change on the network thread.
+    """
+    ctrl = ControllerBase(log_lever=logging.WARNING)
+    ctrl.addVariable("stop_raw", DataType.STRING, "[24,0,0]")
+    ctrl.addVariable("stopinput", DataType.STRING, "[24,0,0]", parser=parseFloats)
+    ctrl.addVariable("sensor_raw", DataType.STRING, "00011000")
+    ctrl.addVariable("sensor", DataType.STRING, "00011000", parser=parseBits(8))
+
+    results = {}
+    for label, read in (("stop_eval", lambda: eval(ctrl.getValue("stop_raw"))[0] >= 24.0),
+                        ("stop_literal_eval", lambda: stopHigh(ctrl.getValue("stop_raw"))),
+                        ("stop_structured", lambda: stopHigh(ctrl.getValue("stopinput"))),
+                        ("sensor_raw", lambda: RUNROBOT.control(ctrl.getValue("sensor_raw"))),
+                        ("sensor_structured", lambda: RUNROBOT.control(ctrl.getValue("sensor")))):
+        t0 = time.perf_counter()
+        for _ in range(calls):
+            read()
+        results[f"{label}_ns_per_tick"] = round((time.perf_counter() - t0) / calls * 1e9, 1)
+
+    for label, name in (("apply_raw", "stop_raw"), ("apply_structured", "stopinput")):
+        datagrams = [{name: f"[{i % 2 * 24},0,0]"} for i in range(calls)]
+        t0 = time.perf_counter()
+        for datagram in datagrams:
+            ctrl._apply_received(datagram)
+        results[f"{label}_ns_per_change"] = round((time.perf_counter() - t0) / calls * 1e9, 1)
+    return results
+
+
+def bench_io_map(count:int=256, batches:int=2000):
+    """
+    PLC-style I/O map of count variables (BYTE inputs/outputs, INT and FLOAT analogs) written and read
+    as a whole: setValue per variable vs one setValues batch, getValue per variable vs getValues, and
+    applying one inbound datagram carrying every input.
+    """
+    kinds = ((DataType.BYTE, lambda i, k: (i + k) & 0xFF), (DataType.INT, lambda i, k: i * k),
+             (DataType.FLOAT, lambda i, k: i * 0.5 + k), (DataType.BOOL, lambda i, k: (i + k) % 2 == 0))
+    ctrl = ControllerBase(log_lever=logging.WARNING)
+    names = []
+    for i in range(count):
+        datatype, _ = kinds[i % len(kinds)]
+        ctrl.addVariable(f"io{i}", datatype, ctrl.checkValue(0, datatype))
+        names.append(f"io{i}")
+    frames = [{name: kinds[i % len(kinds)][1](i, k) for i, name in enumerate(names)} for k in range(1, 9)]
+
+    def per_variable(k):
+        for name, value in frames[k & 7].items():
+            ctrl.setValue(name, value, send_update=False)
+    def batch(k):
+        ctrl.setValues(frames[k & 7], send_update=False)
+    def read_each(k):
+        return [ctrl.getValue(name) for name in names]
+    def read_batch(k):
+        return ctrl.getValues(names)
+    def inbound(k):
+        ctrl._apply_received(dict(frames[k & 7]))
+
+    results = {"variables": count}
+    for label, step in (("setValue_loop", per_variable), ("setValues", batch), ("getValue_loop", read_each),
+                        ("getValues", read_batch), ("apply_datagram", inbound)):
+        t0 = time.perf_counter()
+        for k in range(batches):
+            step(k)
+        results[f"{label}_ns_per_variable"] = round((time.perf_counter() - t0) / batches / count * 1e9, 1)
+    return results
+
+
+def bench_sessions(observers:tuple=(0, 1, 4), count:int=1000):
+    """
+    One controller port serving the sim plus read-only observers: setValue -> wire latency at the sim,
+    and whether every observer saw every update, as observers are added.
+    """
+    results = {}
+    for index, observer_count in enumerate(observers):
+        port = BASE_PORT + 600 + index
+        ctrl = _start(UDP_Controller, port)
+        sim = LoopbackPeer(port)
+        sim.connect()
+        watchers = []
+        for _ in range(observer_count):
+            watcher = LoopbackPeer(port)
+            watcher.send({"poll":1, "observe":1})
+            watcher.recv()
+            watcher.recv()   # snapshot
+            watchers.append(watcher)
+        last = [None] * observer_count
+        def drain(timeout):
+            for k, watcher in enumerate(watchers):
+                watcher.sock.settimeout(timeout)
+                try:
+                    while last[k] != float(count):
+                        last[k] = watcher.recv().get("left_speed", last[k])
+                except (socket.timeout, BlockingIOError):
+                    pass
+        samples = []
+        for i in range(1, count + 1):
+            t0 = time.perf_counter()
+            ctrl.setValue("left_speed", float(i))
+            sim.recv()
+            samples.append((time.perf_counter() - t0) * 1e6)
+            if i % 32 == 0:
+                # Keep the observer sockets from overflowing (not timed)
+                drain(0)
+        drain(1.0)
+        seen = last.count(float(count))
+        row = _summary(samples)
+        row["observers_in_sync"] = f"{seen}/{observer_count}"
+        results[f"observers={observer_count}"] = row
+        ctrl.close()
+        ctrl.join(1.0)
+        for peer in [sim] + watchers:
+            peer.close()
+    return results
+
+
+def bench_link(trials:int=10, interval:float=0.02, timeout:float=0.1):
+    """
+    Liveness monitor against a fake gateway (100 packets/s) that pauses and resumes: time from the
+    pause until the link is declared lost (failsafe applied) and from the resume until it is back,
+    the heartbeat RTT estimate and the heartbeat rate.
+    """
+    port = BASE_PORT + 700
+    ctrl = UDP_Controller(ip=HOST, port=port, log_lever=logging.WARNING)
+    ctrl.addVariable("sensor", DataType.STRING, "")
+    ctrl.addVariable("stopinput", DataType.STRING, "")
+    ctrl.addVariable("left_speed", DataType.FLOAT, 0.0)
+    ctrl.addVariable("right_speed", DataType.FLOAT, 0.0)
+    changes = []
+    ctrl.addConnectionCallback(lambda state, address: changes.append((time.perf_counter(), state)))
+    ctrl.setHeartbeat(interval, timeout)
+    ctrl.setFailsafe({"left_speed": 0.0, "right_speed": 0.0})
+    ctrl.start()
+    pool = FakeGatewayPool()
+    gateway = pool.add(port, pong=True)
+    pool.start()
+    time.sleep(0.3)
+
+    def wait_state(state, since):
+        deadline = time.perf_counter() + 10 * timeout
+        while time.perf_counter() < deadline:
+            for at, changed in list(changes):
+                if changed == state and at >= since:
+                    return (at - since) * 1e6
+            time.sleep(0.001)
+        return None
+
+    lost_us, restored_us = [], []
+    failsafe = 0
+    start = time.perf_counter()
+    heartbeats = ctrl.stats()["heartbeats"]
+    for _ in range(trials):
+        ctrl.setValues({"left_speed": 1.0, "right_speed": 1.0})
+        time.sleep(2 * timeout)
+        paused = time.perf_counter()
+        gateway.paused = True
+        delay = wait_state(LOST, paused)
+        if delay is not None:
+            lost_us.append(delay)
+            failsafe += ctrl.getValues(["left_speed", "right_speed"]) == [0.0, 0.0]
+        resumed = time.perf_counter()
+        gateway.paused = False
+        delay = wait_state(CONNECTED, resumed)
+        if delay is not None:
+            restored_us.append(delay)
+    elapsed = time.perf_counter() - start
+    rtt = ctrl.rtt()
+    results = {
+        "timeout_ms": timeout * 1e3,
+        "lost_after": _summary(lost_us) if lost_us else None,
+        "restored_after": _summary(restored_us) if restored_us else None,
+        "failsafe_applied": f"{failsafe}/{trials}",
+        "rtt_us": round(rtt * 1e6, 1) if rtt is not None else None,
+        "heartbeats_per_s": round((ctrl.stats()["heartbeats"] - heartbeats) / elapsed, 1),
+        }
+    ctrl.close()
+    ctrl.join(1.0)
+    pool.close()
+    pool.join(1.0)
+    return results
+
+
+BENCHMARKS = {
+    "run_loop": bench_run_loop,
+    "wire": bench_wire,
+    "store_stress": bench_store_stress,
+    "variables": bench_variables,
+    "critical_stop": bench_critical_stop,
+    "fleet": bench_fleet,
+    "latency": bench_latency,
+    "loops": bench_loops,
+    "throughput": bench_throughput,
+    "receive": bench_receive,
+    "column_log": bench_column_log,
+    "line_follow": bench_line_follow,
+    "state_machines": bench_state_machines,
+    "input_wait": bench_input_wait,
+    "structured": bench_structured,
+    "io_map": bench_io_map,
+    "sessions": bench_sessions,
+    "link": bench_link,
+    }
+
+
+def _revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _flatten(results:dict, prefix:str=""):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{key}", value
+
+
+def compare(baseline:dict, current:dict):
+    """Print every numeric result that exists in both runs with its relative change."""
+    old = dict(_flatten(baseline["results"]))
+    for key, value in _flatten(current["results"]):
+        if key in old and old[key]:
+            change = 100.0 * (value - old[key]) / abs(old[key])
+            print(f"{key:70s} {old[key]:>14} -> {value:<14} {change:+8.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UDP_Controller benchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--output", help="write all results to this JSON file")
+    parser.add_argument("--compare", help="previous --output file to compare against")
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name}")
+
+    report = {
+        "revision": _revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {},
+        }
+    for name in args.names or list(BENCHMARKS):
+        report["results"][name] = BENCHMARKS[name]()
+        print(json.dumps({"benchmark": name, "results": report["results"][name]}))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)